@@ -52,6 +52,7 @@ class DemoGUI:
 
         self.is_play_mode = 0
         self.is_recording = False
+        self.is_continuous = False
 
         # ─── RECORD MODE ─────────────────────────────────────────────────
 
@@ -81,8 +82,13 @@ class DemoGUI:
         self.record_btn_text = StringVar(self.TAB2, name="record_btn_text")
         self.record_btn_text.set("Record")
         self.is_recording = False
-        record_btn_p = Button(self.TAB2, textvariable=self.record_btn_text,
-                              command=self.record_btn_cb).grid(columnspan=2, sticky=W)
+        self.record_btn_p = Button(self.TAB2, textvariable=self.record_btn_text, command=self.record_btn_cb)
+        self.record_btn_p.grid(columnspan=2, sticky=W)
+
+        # continuous mode, signs are detected and translated without the record button.
+        self.continuous_var = IntVar(self.TAB2, value=0)
+        Checkbutton(self.TAB2, text="Continuous", variable=self.continuous_var,
+                    command=self.continuous_btn_cb).grid(columnspan=2, sticky=W)
 
         # Show console.
         self.console_box = Text(self.TAB2, bg="#44a18e")
@@ -103,6 +109,17 @@ class DemoGUI:
             self.name_box["state"] = NORMAL
             self.save_btn["state"] = NORMAL
 
+    def continuous_btn_cb(self):
+        self.is_continuous = bool(self.continuous_var.get())
+        tab_id = self.notebook.index(self.notebook.select())
+        if self.is_continuous:
+            self.notebook.tab(not tab_id, state="disabled")
+            self.record_btn_p["state"] = DISABLED
+
+        else:
+            self.notebook.tab(not tab_id, state="normal")
+            self.record_btn_p["state"] = NORMAL
+
     def tab_btn_cb(self, event):
         self.is_play_mode = self.notebook.index("current")
 
@@ -12,52 +12,88 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gin
 import mediapipe as mp
 import numpy as np
 import numpy.typing as npt
 
+from modules.utils import profiling
+
 from . import utils
+from .presence_gate import PresenceGate
 
 
+@gin.configurable
 class HolisticManager():
 
-    def __init__(self):
+    def __init__(self,
+                 selected_pose: list[int],
+                 selected_face: list[int],
+                 presence_gate: bool = False,
+                 draw_mode: str = "full"):
+        # Resolved once, gin lookups are too slow for the per-frame path.
+        self.selected_pose = list(selected_pose)
+        self.selected_face = list(selected_face)
+
+        # "none" for headless use, "sparse" for selected joints only, "full" for MediaPipe drawing.
+        assert draw_mode in utils.DRAW_MODES, f"[ERROR] Unknown draw mode {draw_mode}, choose from {utils.DRAW_MODES}."
+        self.draw_mode = draw_mode
+
+        # Skip the holistic graph on frames without a person, for realtime use only.
+        self.presence_gate = PresenceGate() if presence_gate else None
         self.detector = mp.solutions.holistic.Holistic(min_detection_confidence=0.5,
                                                        smooth_landmarks=False,
                                                        min_tracking_confidence=0.5,
                                                        model_complexity=1)
 
+    def warmup(self, size: int = 480):
+        """Run the holistic graph once on a blank frame, its first call initializes the models."""
+        self.detector.process(np.zeros([size, size, 3], dtype=np.uint8))
+
     def __call__(self, frame: npt.ArrayLike) -> dict:
 
-        # Empty results.
+        # Empty results, also used as parsing buffers.
         pose_4d = np.zeros([15, 4], dtype=np.float32)
         face_3d = np.zeros([25, 3], dtype=np.float32)
         lh_3d = np.zeros([21, 3], dtype=np.float32)
         rh_3d = np.zeros([21, 3], dtype=np.float32)
 
+        if self.presence_gate is not None and not self.presence_gate.should_process(frame):
+            return {"pose_4d": pose_4d, "face_3d": face_3d, "lh_3d": lh_3d, "rh_3d": rh_3d}
+
         # Run detector.
         frame.flags.writeable = False
-        mp_results = self.detector.process(frame)
+        with profiling.stage("holistic.process"):
+            mp_results = self.detector.process(frame)
         frame.flags.writeable = True
 
-        # Parse results.
-        if mp_results.pose_landmarks is not None:
-            pose_4d = utils.parse_landmarks(mp_results.pose_landmarks.landmark, get_visibility=True)
-            # Remove unwanted joints.
-            pose_4d = utils.filter_pose(pose_4d)
+        if self.presence_gate is not None:
+            self.presence_gate.update(mp_results.pose_landmarks is not None)
+
+        # Parse results, only the selected joints, directly into the result buffers.
+        with profiling.stage("holistic.parse"):
+            if mp_results.pose_landmarks is not None:
+                utils.parse_selected_landmarks(mp_results.pose_landmarks.landmark,
+                                               self.selected_pose,
+                                               get_visibility=True,
+                                               out=pose_4d)
+
+            if mp_results.face_landmarks is not None:
+                utils.parse_selected_landmarks(mp_results.face_landmarks.landmark, self.selected_face, out=face_3d)
 
-        if mp_results.face_landmarks is not None:
-            face_3d = utils.parse_landmarks(mp_results.face_landmarks.landmark)
-            # Remove unwanted joints.
-            face_3d = utils.filter_face(face_3d)
+            if mp_results.left_hand_landmarks is not None:
+                utils.parse_selected_landmarks(mp_results.left_hand_landmarks.landmark, out=lh_3d)
 
-        if mp_results.left_hand_landmarks is not None:
-            lh_3d = utils.parse_landmarks(mp_results.left_hand_landmarks.landmark)
+            if mp_results.right_hand_landmarks is not None:
+                utils.parse_selected_landmarks(mp_results.right_hand_landmarks.landmark, out=rh_3d)
 
-        if mp_results.right_hand_landmarks is not None:
-            rh_3d = utils.parse_landmarks(mp_results.right_hand_landmarks.landmark)
+        frame_res = {"pose_4d": pose_4d, "face_3d": face_3d, "lh_3d": lh_3d, "rh_3d": rh_3d}
 
         # Draw.
-        utils.mp_draw(frame, mp_results)
+        with profiling.stage("holistic.draw"):
+            if self.draw_mode == "full":
+                utils.mp_draw(frame, mp_results)
+            elif self.draw_mode == "sparse":
+                utils.draw_sparse(frame, frame_res)
 
-        return {"pose_4d": pose_4d, "face_3d": face_3d, "lh_3d": lh_3d, "rh_3d": rh_3d}
+        return frame_res
@@ -0,0 +1,71 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cv2
+import gin
+import numpy as np
+import numpy.typing as npt
+
+
+@gin.configurable
+class PresenceGate():
+    """Cheap pre-check deciding whether the holistic graph needs to run on a frame.
+
+    While a person is tracked every frame passes. After `absent_frames` consecutive frames without a person
+    the gate goes idle, and only lets a frame through when the downscaled frame difference exceeds
+    `motion_thres`, or every `idle_interval` frames to catch a person standing still.
+    """
+
+    def __init__(self, thumb_size: int = 32, motion_thres: float = 4.0, absent_frames: int = 15, idle_interval: int = 15):
+        self.thumb_size = thumb_size
+        self.motion_thres = motion_thres
+        self.absent_frames = absent_frames
+        self.idle_interval = idle_interval
+        self.reset()
+
+    def reset(self):
+        self.prev_thumb = None
+        self.n_absent = 0
+        self.n_skipped = 0
+
+    @property
+    def is_idle(self) -> bool:
+        return self.n_absent >= self.absent_frames
+
+    def motion(self, frame: npt.ArrayLike) -> float:
+        """Mean absolute difference of the downscaled gray frame with the previous one."""
+        # Subsample before resizing, the area filter then only touches a few thousand pixels.
+        step = max(1, min(frame.shape[:2]) // (self.thumb_size * 2))
+        thumb = cv2.resize(frame[::step, ::step], (self.thumb_size, self.thumb_size), interpolation=cv2.INTER_AREA)
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_RGB2GRAY).astype(np.int16)
+        prev_thumb, self.prev_thumb = self.prev_thumb, thumb
+        if prev_thumb is None:
+            return np.inf
+        return float(np.mean(np.abs(thumb - prev_thumb)))
+
+    def should_process(self, frame: npt.ArrayLike) -> bool:
+        motion = self.motion(frame)
+        if not self.is_idle:
+            return True
+
+        if motion > self.motion_thres or self.n_skipped >= self.idle_interval:
+            self.n_skipped = 0
+            return True
+
+        self.n_skipped += 1
+        return False
+
+    def update(self, person_found: bool):
+        """Feed back the holistic result of a processed frame."""
+        self.n_absent = 0 if person_found else self.n_absent + 1
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import cv2
 import gin
 import mediapipe as mp
 import numpy as np
@@ -22,15 +23,27 @@ mp_drawing = mp.solutions.drawing_utils
 mp_holistic = mp.solutions.holistic
 drawing_spec = mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
 
+DRAW_MODES = ["none", "sparse", "full"]
+SPARSE_COLORS = {"pose_4d": (80, 110, 10), "face_3d": (255, 255, 255), "lh_3d": (245, 117, 66), "rh_3d": (66, 117, 245)}
+
 
 def parse_landmarks(obj, get_visibility=False) -> npt.ArrayLike:
-    result = np.zeros([len(obj), 4]) if get_visibility else np.zeros([len(obj), 3])
-    for i in range(len(obj)):
-        if get_visibility:
-            result[i] = obj[i].x, obj[i].y, obj[i].z, obj[i].visibility
-        else:
-            result[i] = obj[i].x, obj[i].y, obj[i].z
-    return result
+    return parse_selected_landmarks(obj, get_visibility=get_visibility)
+
+
+def parse_selected_landmarks(obj, selected_joints=None, get_visibility=False, out=None) -> npt.ArrayLike:
+    """
+    Parse only the selected landmarks, into a float32 buffer.
+    """
+    landmarks = obj if selected_joints is None else [obj[i] for i in selected_joints]
+    if out is None:
+        out = np.empty([len(landmarks), 4 if get_visibility else 3], dtype=np.float32)
+
+    if get_visibility:
+        out[:] = [(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks]
+    else:
+        out[:] = [(lm.x, lm.y, lm.z) for lm in landmarks]
+    return out
 
 
 def mp_draw(frame, results):
@@ -47,6 +60,22 @@ def mp_draw(frame, results):
     mp_drawing.draw_landmarks(frame, results.right_hand_landmarks, mp.solutions.holistic.HAND_CONNECTIONS)
 
 
+def draw_sparse(frame, frame_res: dict):
+    """
+    Draw only the parsed joints as dots, much cheaper than the face tesselation.
+    """
+    h, w = frame.shape[:2]
+    for k, color in SPARSE_COLORS.items():
+        kps = frame_res[k]
+        # Skip missing parts.
+        if not np.any(kps[:, :2]):
+            continue
+        xs = np.clip(kps[:, 0] * w, 0, w - 1).astype(np.int32)
+        ys = np.clip(kps[:, 1] * h, 0, h - 1).astype(np.int32)
+        for x, y in zip(xs, ys):
+            cv2.circle(frame, (int(x), int(y)), 2, color, -1)
+
+
 @gin.configurable
 def filter_pose(pose_4d: npt.ArrayLike, selected_joints) -> npt.ArrayLike:
     """
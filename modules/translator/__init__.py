@@ -14,4 +14,7 @@
 
 from .data_generator import DataGenerator
 from .model import get_model
+from .prefetcher import BatchPrefetcher
+from .sign_segmenter import SignSegmenter
+from .streaming import StreamingTranslator
 from .translator_manager import TranslatorManager
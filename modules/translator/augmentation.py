@@ -68,7 +68,8 @@ def random_rotate(kps, max_deg, root_idx, ignore_value):
     ry = get_ry(random.randint(-max_deg, max_deg))
     rz = get_rz(random.randint(-max_deg, max_deg))
 
-    kps -= root
+    # Not in place, the input array is left untouched.
+    kps = kps - root
     kps = kps @ rx @ ry @ rz
     kps += root
     kps = np.where(mask, kps, ignore_value)
@@ -89,6 +90,8 @@ def rotate_fingers(kps, max_deg, ignore_value):
     # bf, 21, 3
     ids = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, 16], [17, 18, 19, 20]]
 
+    # Not in place, the input array is left untouched.
+    kps = kps.copy()
     for id in ids:
 
         root = kps[:, id[0]].copy()[:, np.newaxis]
@@ -106,6 +109,8 @@ def rotate_fingers(kps, max_deg, ignore_value):
 
 
 def augment_video(vid):
+    """Returns an augmented copy of the video dict, the input is left untouched."""
+    vid = dict(vid)
     # Pose.
     # vid["pose_frames"] = shift_pose(vid["pose_frames"], max_shift=0.1)
     vid["pose_frames"] = random_rotate(vid["pose_frames"], max_deg=10, root_idx=0)
@@ -119,3 +124,102 @@ def augment_video(vid):
     vid["rh_frames"] = rotate_fingers(vid["rh_frames"], max_deg=10)
 
     return vid
+
+
+## ─── BATCHED ───────────────────────────────────────────────────────────────────
+
+FINGER_IDS = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, 16], [17, 18, 19, 20]]
+
+
+def get_rxyz_batch(degs):
+    """Rotation matrices rx @ ry @ rz for angles [..., 3] in degrees, returns [..., 3, 3]."""
+    rad = np.radians(degs)
+    s = np.sin(rad)
+    c = np.cos(rad)
+    sx, sy, sz = s[..., 0], s[..., 1], s[..., 2]
+    cx, cy, cz = c[..., 0], c[..., 1], c[..., 2]
+
+    # Product of get_rx, get_ry and get_rz written out.
+    rot = np.empty(degs.shape[:-1] + (3, 3))
+    rot[..., 0, 0] = cy * cz
+    rot[..., 0, 1] = -cy * sz
+    rot[..., 0, 2] = sy
+    rot[..., 1, 0] = sx * sy * cz + cx * sz
+    rot[..., 1, 1] = -sx * sy * sz + cx * cz
+    rot[..., 1, 2] = -sx * cy
+    rot[..., 2, 0] = -cx * sy * cz + sx * sz
+    rot[..., 2, 1] = cx * sy * sz + sx * cz
+    rot[..., 2, 2] = cx * cy
+    return rot
+
+
+def random_degrees(shape, max_deg):
+    """Integer angles in [-max_deg, max_deg], same as random.randint."""
+    return np.random.randint(-max_deg, max_deg + 1, size=tuple(shape) + (3,)).astype(np.float64)
+
+
+@gin.configurable
+def random_rotate_batch(kps, max_deg, root_idx, ignore_value):
+    """
+    Same as random_rotate on [B, F, J, 3], one random rotation per sample.
+    """
+
+    assert len(kps.shape) == 4
+    mask = np.not_equal(kps, ignore_value)
+    batch_size, n_frames, n_joints, _ = kps.shape
+
+    rot = get_rxyz_batch(random_degrees([batch_size], max_deg)).astype(kps.dtype)
+    # (kps - root) @ rot + root == kps @ rot + root @ (I - rot), the offset is only [B, F, 3].
+    offset = np.einsum("bfc,bcd->bfd", kps[:, :, root_idx], np.eye(3, dtype=kps.dtype) - rot, optimize=True)
+    out = np.einsum("bnc,bcd->bnd", kps.reshape(batch_size, -1, 3), rot, optimize=True)
+    out = out.reshape(kps.shape)
+    out += offset[:, :, np.newaxis]
+
+    # Samples fully ignored stay untouched thanks to the mask.
+    return np.where(mask, out, ignore_value)
+
+
+@gin.configurable
+def rotate_fingers_batch(kps, max_deg, ignore_value):
+    """
+    Same as rotate_fingers on [B, F, 21, 3], one random rotation per finger of each sample.
+    """
+
+    assert len(kps.shape) == 4
+    batch_size, n_joints = kps.shape[0], kps.shape[2]
+
+    # Finger of every joint, 0 is the wrist which keeps the identity.
+    joint_finger = np.zeros(n_joints, dtype=np.int64)
+    for i, ids in enumerate(FINGER_IDS):
+        joint_finger[ids] = i + 1
+    finger_roots = [0] + [ids[0] for ids in FINGER_IDS]
+
+    rot = np.empty([batch_size, len(finger_roots), 3, 3])
+    rot[:, 0] = np.eye(3)
+    rot[:, 1:] = get_rxyz_batch(random_degrees([batch_size, len(FINGER_IDS)], max_deg))
+    rot = rot.astype(kps.dtype)
+
+    # Same affine form as random_rotate_batch, one offset per finger root.
+    offset = np.einsum("bfkc,bkcd->bfkd", kps[:, :, finger_roots], np.eye(3, dtype=kps.dtype) - rot, optimize=True)
+    out = np.einsum("bfjc,bjcd->bfjd", kps, rot[:, joint_finger], optimize=True)
+    out += offset[:, :, joint_finger]
+
+    # Missing hands are exactly ignore_value, keep them as the loop version does.
+    return np.where(kps == ignore_value, kps, out)
+
+
+def augment_batch(batch):
+    """Same as augment_video on a dict of [B, F, J, 3] arrays, returns a new dict."""
+    batch = dict(batch)
+    # Pose.
+    batch["pose_frames"] = random_rotate_batch(batch["pose_frames"], max_deg=10, root_idx=0)
+    # Face.
+    batch["face_frames"] = random_rotate_batch(batch["face_frames"], max_deg=10, root_idx=0)
+    # Left hand.
+    batch["lh_frames"] = random_rotate_batch(batch["lh_frames"], max_deg=10, root_idx=9)
+    batch["lh_frames"] = rotate_fingers_batch(batch["lh_frames"], max_deg=10)
+    # Right hand.
+    batch["rh_frames"] = random_rotate_batch(batch["rh_frames"], max_deg=10, root_idx=9)
+    batch["rh_frames"] = rotate_fingers_batch(batch["rh_frames"], max_deg=10)
+
+    return batch
@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
 import random
 from pathlib import Path
 
@@ -29,14 +28,30 @@ from . import augmentation
 @gin.configurable
 class DataGenerator(Sequence):
 
-    def __init__(self, root_folder: str, batch_size: int, labels: dict, n_frames: int):
+    def __init__(self,
+                 root_folder: str,
+                 batch_size: int,
+                 labels: dict,
+                 n_frames: int,
+                 lazy: bool = False,
+                 cache_size: int = 0,
+                 use_filter_cache: bool = False):
         root_folder = Path(root_folder)
+        # Read clips with filter_visibility already applied.
+        if use_filter_cache:
+            root_folder = utils.filter_cache.build_filter_cache(root_folder)
+
         self.batch_size = batch_size
         self.n_frames = n_frames
 
         self.labels_dict = labels
         self.dataset_uuids = list(self.labels_dict.keys())
-        self.skeleton_ds = utils.file_utils.load_skeleton_h5(root_folder)
+
+        # Lazy: read only the sampled clips, memory doesn't grow with the corpus.
+        if lazy:
+            self.skeleton_ds = utils.file_utils.LazySkeletonDataset(root_folder, cache_size)
+        else:
+            self.skeleton_ds = utils.file_utils.load_skeleton_h5(root_folder)
 
         for k in self.skeleton_ds.keys():
             print(k, len(self.skeleton_ds[k]))
@@ -47,7 +62,11 @@ class DataGenerator(Sequence):
     def __len__(self):
         return int(1e4)
 
-    def random_train_sample(self, n_pick: int, hards: list[int], hard_p: float = 0.15) -> npt.ArrayLike:
+    def random_train_sample(self,
+                            n_pick: int,
+                            hards: list[int],
+                            hard_p: float = 0.15,
+                            is_augment: bool = True) -> npt.ArrayLike:
         """Choosing one video at random from the dataset and sampling data.
 
         Args:
@@ -66,19 +85,19 @@ class DataGenerator(Sequence):
 
         video = random.choice(self.skeleton_ds[random_uuid])
 
-        # Deep copy to avoid data altered from inplace augmentation.
-        video = copy.deepcopy(video)
-
         assert video["n_frames"] > 8
 
-        # Filter visibility.
-        video = utils.skeleton_utils.filter_visibility(video)
-
-        # Sampling.
+        # Sampling first, the steps below only work on fresh [n_pick, J, C] arrays
+        # and never modify the dataset, so no copy of the whole video is needed.
         s_indices = utils.skeleton_utils.random_sampling(video["n_frames"], n_pick)
         video = utils.skeleton_utils.apply_resampling(video, s_indices)
 
-        video = augmentation.augment_video(video)
+        # Filter visibility, unless read from the filter cache.
+        if not utils.filter_cache.is_filtered(video):
+            video = utils.skeleton_utils.filter_visibility(video)
+
+        if is_augment:
+            video = augmentation.augment_video(video)
 
         return video, label_idx
 
@@ -93,7 +112,8 @@ class DataGenerator(Sequence):
 
         for i in range(self.batch_size):
 
-            samples, label_idx = self.random_train_sample(n_pick=self.n_frames, hards=hards)
+            # Augmented below, in one pass over the whole batch.
+            samples, label_idx = self.random_train_sample(n_pick=self.n_frames, hards=hards, is_augment=False)
 
             p_batch[i] = samples["pose_frames"]
             f_batch[i] = samples["face_frames"]
@@ -102,4 +122,11 @@ class DataGenerator(Sequence):
 
             y_batch[i] = label_idx
 
-        return [p_batch, f_batch, lh_batch, rh_batch], y_batch
+        batch = augmentation.augment_batch({
+            "pose_frames": p_batch,
+            "face_frames": f_batch,
+            "lh_frames": lh_batch,
+            "rh_frames": rh_batch
+        })
+
+        return [batch["pose_frames"], batch["face_frames"], batch["lh_frames"], batch["rh_frames"]], y_batch
@@ -0,0 +1,180 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from pathlib import Path
+
+import gin
+import numpy as np
+import numpy.typing as npt
+import tensorflow as tf
+from tensorflow.keras.models import Model
+
+from . import model
+
+INPUT_NAMES = ["pose_3d", "face_3d", "lh_3d", "rh_3d"]
+INPUT_JOINTS = [15, 25, 21, 21]
+
+QUANTIZATIONS = [None, "float16", "int8"]
+# Ops kept in float by the int8 quantization: masking with ignore_value, normalization and distances don't survive
+# int8 ranges (an int8 DIV by a zero-rounded scale fails). The encoders, CONV_2D and FULLY_CONNECTED, are quantized.
+INT8_FLOAT_OPS = [
+    "DIV", "SQRT", "SQUARE", "SUB", "MUL", "SUM", "SELECT_V2", "EQUAL", "NOT_EQUAL", "REDUCE_ALL", "GATHER",
+    "L2_NORMALIZATION"
+]
+
+
+def get_input_signature(n_frames: int) -> list[tf.TensorSpec]:
+    return [tf.TensorSpec([None, n_frames, n, 3], tf.float32, name=name) for name, n in zip(INPUT_NAMES, INPUT_JOINTS)]
+
+
+def get_feature_model(weights_path: str) -> Model:
+    """Translator model with trained weights and only the `feats_out` output, the classifier head is dropped."""
+    full_model = model.get_model()
+    full_model.load_weights(weights_path)
+    return Model(inputs=full_model.inputs, outputs=full_model.outputs[0])
+
+
+def get_serving_function(feature_model: Model) -> tf.types.experimental.ConcreteFunction:
+    """Concrete function of the feature model, with a dynamic batch dimension."""
+    n_frames = feature_model.inputs[0].shape[1]
+
+    @tf.function(input_signature=get_input_signature(n_frames))
+    def serve(pose_3d, face_3d, lh_3d, rh_3d):
+        return {"feats_out": feature_model([pose_3d, face_3d, lh_3d, rh_3d], training=False)}
+
+    return serve.get_concrete_function()
+
+
+def export_saved_model(feature_model: Model, out_dir: Path):
+    module = tf.Module()
+    module.feature_model = feature_model
+    tf.saved_model.save(module,
+                        Path(out_dir).as_posix(),
+                        signatures={"serving_default": get_serving_function(feature_model)})
+
+
+def export_tflite(feature_model: Model, out_path: Path, quantization: str = None, representative_dataset=None) -> int:
+    """Convert with builtin ops only, so the XNNPACK delegate runs the whole graph. Returns the file size.
+
+    Args:
+        feature_model (Model): Model from `get_feature_model`.
+        out_path (Path): .tflite file.
+        quantization (str, optional): None keeps float32. "float16" stores the weights in float16. "int8" quantizes
+            weights and activations, with ranges calibrated on `representative_dataset`. Inputs and outputs stay
+            float32 and ops without an int8 kernel stay in float.
+        representative_dataset (optional): Generator of input dicts keyed by `INPUT_NAMES`, for "int8".
+    """
+    assert quantization in QUANTIZATIONS, f"[ERROR] Unknown quantization {quantization}, choose from {QUANTIZATIONS}."
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([get_serving_function(feature_model)], feature_model)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        assert representative_dataset is not None, "[ERROR] int8 quantization needs a representative_dataset."
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+
+    if quantization == "int8":
+        # Selective quantization, the keypoint preprocessing and distance matrices stay in float.
+        debugger = tf.lite.experimental.QuantizationDebugger(
+            converter=converter,
+            debug_dataset=representative_dataset,
+            debug_options=tf.lite.experimental.QuantizationDebugOptions(denylisted_ops=INT8_FLOAT_OPS))
+        tflite_model = debugger.get_nondebug_quantized_model()
+    else:
+        tflite_model = converter.convert()
+
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+
+## ─── ENCODERS ──────────────────────────────────────────────────────────────────
+# Callables mapping the 4 input arrays [B, n_frames, J, 3] to the features [B, D] as a numpy array.
+
+
+class KerasEncoder():
+    """h5 weights, the graph is rebuilt from the gin config and traced on the first call."""
+
+    def __init__(self, weights_path: str):
+        feature_model = get_feature_model(weights_path)
+        self.n_frames = feature_model.inputs[0].shape[1]
+        # The model has a dynamic batch dimension, avoid a new trace for every batch size.
+        self.model = tf.function(feature_model, reduce_retracing=True)
+
+    def __call__(self, inputs: list[npt.ArrayLike]) -> npt.ArrayLike:
+        return self.model(inputs).numpy()
+
+
+class SavedModelEncoder():
+    """SavedModel from `export_saved_model`, already traced and independent of the gin config."""
+
+    def __init__(self, saved_model_dir: str):
+        self.saved_model = tf.saved_model.load(Path(saved_model_dir).as_posix())
+        self.serve = self.saved_model.signatures["serving_default"]
+        self.n_frames = self.serve.structured_input_signature[1]["pose_3d"].shape[1]
+
+    def __call__(self, inputs: list[npt.ArrayLike]) -> npt.ArrayLike:
+        kwargs = {name: tf.convert_to_tensor(x, tf.float32) for name, x in zip(INPUT_NAMES, inputs)}
+        return self.serve(**kwargs)["feats_out"].numpy()
+
+
+@gin.configurable
+class TFLiteEncoder():
+    """TFLite model from `export_tflite`, run by the default XNNPACK delegate on CPU.
+
+    The interpreter is resized when the batch size changes, and is not thread safe: calls are serialized.
+    """
+
+    def __init__(self, tflite_path: str, num_threads: int = None):
+        self.interpreter = tf.lite.Interpreter(model_path=Path(tflite_path).as_posix(), num_threads=num_threads)
+        self.lock = threading.Lock()
+
+        input_details = self.interpreter.get_input_details()
+        # Input names depend on the converter, e.g. "serving_default_pose_3d:0".
+        self.input_indices = [next(d["index"] for d in input_details if name in d["name"]) for name in INPUT_NAMES]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.n_frames = int(input_details[0]["shape_signature"][1])
+        self.batch_size = None
+
+    def resize(self, batch_size: int):
+        for index, n in zip(self.input_indices, INPUT_JOINTS):
+            self.interpreter.resize_tensor_input(index, [batch_size, self.n_frames, n, 3])
+        self.interpreter.allocate_tensors()
+        self.batch_size = batch_size
+
+    def __call__(self, inputs: list[npt.ArrayLike]) -> npt.ArrayLike:
+        with self.lock:
+            batch_size = len(inputs[0])
+            if batch_size != self.batch_size:
+                self.resize(batch_size)
+
+            for index, x in zip(self.input_indices, inputs):
+                self.interpreter.set_tensor(index, np.asarray(x, dtype=np.float32))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index)
+
+
+def get_encoder(model_path: str):
+    """Encoder of `model_path`: a .tflite file, a SavedModel directory, otherwise Keras h5 weights."""
+    model_path = Path(model_path)
+    if model_path.suffix == ".tflite":
+        return TFLiteEncoder(model_path)
+    if (model_path / "saved_model.pb").exists():
+        return SavedModelEncoder(model_path)
+    return KerasEncoder(model_path)
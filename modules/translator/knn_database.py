@@ -0,0 +1,134 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+FEATS_FILE = "feats.f32"
+LABELS_FILE = "labels.i32"
+GLOSSES_FILE = "glosses.txt"
+META_FILE = "meta.json"
+
+
+class KnnDatabase():
+    """Binary KNN store.
+
+    Layout in `knn_dir`:
+        feats.f32    contiguous float32 matrix [n_records, dim], row major.
+        labels.i32   int32 gloss index of each record [n_records].
+        glosses.txt  gloss-name table, one name per line.
+        meta.json    {"dim": dim}
+    """
+
+    def __init__(self, knn_dir: str) -> None:
+        self.knn_dir = Path(knn_dir)
+        self.feats_path = self.knn_dir / FEATS_FILE
+        self.labels_path = self.knn_dir / LABELS_FILE
+        self.glosses_path = self.knn_dir / GLOSSES_FILE
+        self.meta_path = self.knn_dir / META_FILE
+
+    def exists(self) -> bool:
+        return self.meta_path.is_file() and self.feats_path.is_file()
+
+    def read_dim(self) -> int:
+        with open(self.meta_path, "r") as f:
+            return json.load(f)["dim"]
+
+    def read_glosses(self) -> list[str]:
+        if not self.glosses_path.is_file():
+            return []
+        with open(self.glosses_path, "r") as f:
+            return [line.rstrip("\n") for line in f if line.rstrip("\n") != ""]
+
+    def __len__(self) -> int:
+        if not self.exists():
+            return 0
+        return self.labels_path.stat().st_size // np.dtype(np.int32).itemsize
+
+    def version(self) -> list[int]:
+        """Number of records and mtime of the features, changed by every append or rewrite of the store."""
+        if not self.exists():
+            return [0, 0]
+        return [len(self), self.feats_path.stat().st_mtime_ns]
+
+    def load(self) -> tuple[npt.ArrayLike, npt.ArrayLike, npt.ArrayLike]:
+        """Map the store into memory without reading it.
+
+        Returns:
+            tuple: feats memmap [n, dim], label index memmap [n], gloss names [n_glosses].
+        """
+        dim = self.read_dim()
+        n_records = len(self)
+        if n_records == 0:
+            return np.zeros([0, dim], dtype=np.float32), np.zeros([0], dtype=np.int32), np.array(self.read_glosses())
+
+        feats = np.memmap(self.feats_path, dtype=np.float32, mode="r", shape=(n_records, dim))
+        label_ids = np.memmap(self.labels_path, dtype=np.int32, mode="r", shape=(n_records,))
+        glosses = np.array(self.read_glosses())
+        return feats, label_ids, glosses
+
+    def append(self, gloss_name: str, knn_records: list[npt.ArrayLike]):
+        """Append records of one gloss, without re-reading existing records."""
+        feats = np.asarray(knn_records, dtype=np.float32)
+        if feats.ndim == 1:
+            feats = feats[np.newaxis]
+        if len(feats) == 0:
+            return
+
+        self.knn_dir.mkdir(parents=True, exist_ok=True)
+        if self.exists():
+            dim = self.read_dim()
+            assert feats.shape[1] == dim, f"[ERROR] Feature dim {feats.shape[1]} doesn't match database dim {dim}."
+        else:
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": int(feats.shape[1])}, f)
+
+        glosses = self.read_glosses()
+        if gloss_name in glosses:
+            gloss_idx = glosses.index(gloss_name)
+        else:
+            gloss_idx = len(glosses)
+            with open(self.glosses_path, "a") as f:
+                f.write(gloss_name + "\n")
+
+        with open(self.feats_path, "ab") as f:
+            f.write(np.ascontiguousarray(feats).tobytes())
+        with open(self.labels_path, "ab") as f:
+            f.write(np.full(len(feats), gloss_idx, dtype=np.int32).tobytes())
+
+
+def migrate_txt_database(knn_dir: str) -> bool:
+    """One-shot conversion of the old per-gloss `<gloss>.txt` layout into the binary store.
+
+    The text files are left untouched, the conversion is skipped if the binary store already exists.
+    """
+    knn_database = KnnDatabase(knn_dir)
+    if knn_database.exists():
+        return False
+
+    txt_files = sorted(Path(knn_dir).glob("*.txt"))
+    txt_files = [txt for txt in txt_files if txt.name != GLOSSES_FILE]
+    if len(txt_files) == 0:
+        return False
+
+    logging.info(f"Migrating {len(txt_files)} txt files to binary KNN database at {knn_dir}.")
+    for txt in txt_files:
+        arr = np.loadtxt(txt, ndmin=2)
+        knn_database.append(txt.stem, arr)
+
+    return True
@@ -0,0 +1,350 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+from pathlib import Path
+
+import gin
+import numpy as np
+import numpy.typing as npt
+
+
+IVF_FILE = "ivf.npz"
+IVF_FEATS_FILE = "ivf_feats.f32"
+
+
+def top_k(dists: npt.ArrayLike, k: int) -> npt.ArrayLike:
+    """Indices of the k smallest values of a 1D array, sorted by value."""
+    k = min(k, len(dists))
+    if k < len(dists):
+        part = np.argpartition(dists, k - 1)[:k]
+    else:
+        part = np.arange(len(dists))
+    return part[np.argsort(dists[part])]
+
+
+def top_k_batch(dists: npt.ArrayLike, k: int) -> npt.ArrayLike:
+    """Row-wise `top_k` of a 2D array."""
+    k = min(k, dists.shape[1])
+    if k < dists.shape[1]:
+        part = np.argpartition(dists, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(dists.shape[1]), dists.shape)
+    order = np.argsort(np.take_along_axis(dists, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def mode_vote(top_label_ids: npt.ArrayLike, label_rank: npt.ArrayLike) -> tuple[npt.ArrayLike, npt.ArrayLike]:
+    """Most frequent label of every row, ties go to the lowest `label_rank`.
+
+    Args:
+        top_label_ids (npt.ArrayLike): Label index of the neighbours [N, k], -1 for padding, which never votes.
+        label_rank (npt.ArrayLike): Tie-break rank of every label index.
+
+    Returns:
+        tuple: Winning label index [N] and its vote count [N], -1 and 0 for rows with only padding.
+    """
+    valid = top_label_ids >= 0
+    # Votes of the label at each position [N, k].
+    counts = np.sum((top_label_ids[:, :, np.newaxis] == top_label_ids[:, np.newaxis, :]) & valid[:, np.newaxis, :],
+                    axis=-1)
+    counts = np.where(valid, counts, 0)
+    # Any valid label scores at least 1, above the padding.
+    score = np.where(valid, counts * (len(label_rank) + 1) - label_rank[np.maximum(top_label_ids, 0)], -len(label_rank))
+    winner = np.argmax(score, axis=1)[:, np.newaxis]
+    label_ids = np.take_along_axis(top_label_ids, winner, axis=1)[:, 0]
+    votes = np.take_along_axis(counts, winner, axis=1)[:, 0]
+    return np.where(votes > 0, label_ids, -1), votes
+
+
+class BruteForceIndex():
+    """Exact search over every record."""
+
+    def __init__(self, max_chunk_elements: int = 2**25):
+        self.max_chunk_elements = max_chunk_elements
+        self.feats_sq = None
+
+    def build(self, feats: npt.ArrayLike, index_dir: Path = None, version: list[int] = None):
+        """Map the records, `index_dir` and `version` are unused: there's nothing to save."""
+        self.feats = feats
+        # Norms are computed on the first batch search, to keep the build free.
+        self.feats_sq = None
+        return self
+
+    def load(self, index_dir: Path, version: list[int]) -> bool:
+        return False
+
+    def search(self, feats: npt.ArrayLike, k: int) -> tuple[npt.ArrayLike, npt.ArrayLike]:
+        """Find k nearest records of one query.
+
+        Args:
+            feats (npt.ArrayLike): Query vector [dim].
+            k (int): Number of neighbours.
+
+        Returns:
+            tuple: Euclidean distances [k] and record indices [k], nearest first.
+        """
+        dists = np.sqrt(np.sum(np.square(self.feats - feats), axis=-1))
+        indices = top_k(dists, k)
+        return dists[indices], indices
+
+    def search_batch(self, feats: npt.ArrayLike, k: int) -> tuple[npt.ArrayLike, npt.ArrayLike]:
+        """Find k nearest records of many queries, with ||a||^2 + ||b||^2 - 2ab distances.
+
+        Args:
+            feats (npt.ArrayLike): Query vectors [N, dim].
+            k (int): Number of neighbours.
+
+        Returns:
+            tuple: Euclidean distances [N, k] and record indices [N, k], nearest first.
+        """
+        feats = np.asarray(feats, dtype=np.float32)
+        if self.feats_sq is None:
+            self.feats_sq = np.sum(np.square(self.feats, dtype=np.float32), axis=1)
+
+        # Bound the [chunk, n_records] distance matrix.
+        chunk_size = max(1, self.max_chunk_elements // max(1, len(self.feats)))
+        out_dists = np.empty([len(feats), min(k, len(self.feats))], dtype=np.float32)
+        out_indices = np.empty(out_dists.shape, dtype=np.int64)
+        for start in range(0, len(feats), chunk_size):
+            chunk = feats[start:start + chunk_size]
+            dists = np.sum(np.square(chunk), axis=1)[:, np.newaxis] + self.feats_sq - 2 * chunk @ self.feats.T
+            indices = top_k_batch(dists, k)
+            out_indices[start:start + len(chunk)] = indices
+            out_dists[start:start + len(chunk)] = np.sqrt(np.maximum(np.take_along_axis(dists, indices, axis=1), 0.))
+        return out_dists, out_indices
+
+
+@gin.configurable
+class IVFIndex():
+    """Inverted-file index.
+
+    Records are clustered with k-means into `n_lists` cells, and stored contiguously cell by cell.
+    A query only scans the `n_probe` cells whose centroids are closest to it.
+
+    Built with an `index_dir`, the cells are saved next to the KNN database: `ivf.npz` holds the centroids, cell
+    offsets, record order and norms, `ivf_feats.f32` the records sorted by cell, which is mapped instead of copied
+    into memory. `load` reuses them as long as the store `version` and the build parameters are unchanged.
+    """
+
+    def __init__(self,
+                 n_lists: int = None,
+                 n_probe: int = 8,
+                 n_iter: int = 10,
+                 max_train: int = 100000,
+                 seed: int = 0,
+                 max_chunk_elements: int = 2**25):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.max_train = max_train
+        self.seed = seed
+        self.max_chunk_elements = max_chunk_elements
+
+    @staticmethod
+    def assign(feats: npt.ArrayLike, centroids: npt.ArrayLike, chunk_size: int = 65536) -> npt.ArrayLike:
+        """Nearest centroid of every row, in chunks to bound memory."""
+        c_sq = np.sum(np.square(centroids), axis=1)
+        out = np.empty(len(feats), dtype=np.int64)
+        for start in range(0, len(feats), chunk_size):
+            chunk = np.asarray(feats[start:start + chunk_size], dtype=np.float32)
+            # ||a||^2 is constant per row, so it doesn't change the argmin.
+            out[start:start + len(chunk)] = np.argmin(c_sq - 2 * chunk @ centroids.T, axis=1)
+        return out
+
+    def params(self) -> list[int]:
+        """Build parameters, a saved index built with other ones is stale."""
+        return [-1 if self.n_lists is None else self.n_lists, self.n_iter, self.max_train, self.seed]
+
+    def build(self, feats: npt.ArrayLike, index_dir: Path = None, version: list[int] = None):
+        """Cluster the records, and save the cells to `index_dir` if given.
+
+        Args:
+            feats (npt.ArrayLike): Records [n_records, dim], can be a memmap.
+            index_dir (Path, optional): Directory of the saved index, None keeps it in memory only.
+            version (list[int], optional): Version of the store, checked by `load`.
+        """
+        rng = np.random.default_rng(self.seed)
+        n_records = len(feats)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_records)))
+        n_lists = min(n_lists, n_records)
+
+        # K-means on a random subset.
+        train_idx = rng.choice(n_records, size=min(n_records, self.max_train), replace=False)
+        train = np.asarray(feats[np.sort(train_idx)], dtype=np.float32)
+        centroids = train[rng.choice(len(train), size=n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assigned = self.assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assigned, train)
+            counts = np.bincount(assigned, minlength=n_lists)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+
+        # Sort all records by cell.
+        assigned = self.assign(feats, centroids)
+        order = np.argsort(assigned, kind="stable")
+        counts = np.bincount(assigned, minlength=n_lists)
+
+        self.centroids = centroids
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.ids = order
+        if index_dir is None:
+            self.feats = np.asarray(feats[order], dtype=np.float32)
+            self.feats_sq = np.sum(np.square(self.feats), axis=1)
+        else:
+            self.save(feats, Path(index_dir), version)
+
+        logging.info(f"IVF index: {n_records} records in {n_lists} lists.")
+        return self
+
+    def save(self, feats: npt.ArrayLike, index_dir: Path, version: list[int], chunk_size: int = 65536):
+        """Write the records sorted by cell in chunks, then the cells, and map the sorted records."""
+        index_dir.mkdir(parents=True, exist_ok=True)
+        feats_path = index_dir / IVF_FEATS_FILE
+        self.feats_sq = np.empty(len(self.ids), dtype=np.float32)
+        # Written aside then renamed, an interrupted build leaves the previous index whole.
+        with open(feats_path.with_suffix(".tmp"), "wb") as f:
+            for start in range(0, len(self.ids), chunk_size):
+                chunk = np.asarray(feats[self.ids[start:start + chunk_size]], dtype=np.float32)
+                self.feats_sq[start:start + len(chunk)] = np.sum(np.square(chunk), axis=1)
+                f.write(chunk.tobytes())
+        os.replace(feats_path.with_suffix(".tmp"), feats_path)
+
+        # The cells come last, they mark a complete index.
+        with open((index_dir / IVF_FILE).with_suffix(".tmp"), "wb") as f:
+            np.savez(f,
+                     centroids=self.centroids,
+                     offsets=self.offsets,
+                     ids=self.ids,
+                     feats_sq=self.feats_sq,
+                     version=np.array(version, dtype=np.int64),
+                     params=np.array(self.params(), dtype=np.int64))
+        os.replace((index_dir / IVF_FILE).with_suffix(".tmp"), index_dir / IVF_FILE)
+
+        self.feats = np.memmap(feats_path, dtype=np.float32, mode="r", shape=(len(self.ids), feats.shape[1]))
+
+    def load(self, index_dir: Path, version: list[int]) -> bool:
+        """Load the index saved by `build`, False if there's none or it's stale for this `version` of the store."""
+        ivf_path = Path(index_dir) / IVF_FILE
+        feats_path = Path(index_dir) / IVF_FEATS_FILE
+        if not ivf_path.is_file() or not feats_path.is_file():
+            return False
+
+        with np.load(ivf_path) as data:
+            if data["version"].tolist() != list(version) or data["params"].tolist() != self.params():
+                return False
+            centroids, offsets, ids, feats_sq = data["centroids"], data["offsets"], data["ids"], data["feats_sq"]
+
+        shape = (len(ids), centroids.shape[1])
+        if feats_path.stat().st_size != np.prod(shape) * np.dtype(np.float32).itemsize:
+            return False
+
+        self.centroids, self.offsets, self.ids, self.feats_sq = centroids, offsets, ids, feats_sq
+        self.feats = np.memmap(feats_path, dtype=np.float32, mode="r", shape=shape)
+        logging.info(f"IVF index: {len(ids)} records in {len(centroids)} lists, loaded from {index_dir}.")
+        return True
+
+    def probed_rows(self, probes: npt.ArrayLike) -> npt.ArrayLike:
+        """Rows of the probed cells of every query [N, max candidates], padded with -1.
+
+        Args:
+            probes (npt.ArrayLike): Probed cells of every query [N, n_probe].
+        """
+        n_queries, n_probe = probes.shape
+        sizes = self.offsets[probes + 1] - self.offsets[probes]
+        lens = sizes.ravel()
+
+        rows = np.full([n_queries, max(1, sizes.sum(axis=1).max())], -1, dtype=np.int64)
+        # Position of every candidate in its cell, and of every cell in the row of its query.
+        within = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+        query = np.repeat(np.repeat(np.arange(n_queries), n_probe), lens)
+        cell_col = (np.cumsum(sizes, axis=1) - sizes).ravel()
+        rows[query, np.repeat(cell_col, lens) + within] = np.repeat(self.offsets[probes].ravel(), lens) + within
+        return rows
+
+    def search(self, feats: npt.ArrayLike, k: int) -> tuple[npt.ArrayLike, npt.ArrayLike]:
+        """Same as `BruteForceIndex.search`, approximate, see `search_batch` for the padding.
+
+        Cells are contiguous, they are scanned in place instead of gathered as in `search_batch`.
+        """
+        feats = np.asarray(feats, dtype=np.float32)
+        out_dists = np.full([k], np.inf, dtype=np.float32)
+        out_indices = np.full([k], -1, dtype=np.int64)
+
+        c_sq = np.sum(np.square(self.centroids), axis=1)
+        probes = top_k(c_sq - 2 * self.centroids @ feats, self.n_probe)
+        cells = [(self.offsets[c], self.offsets[c + 1]) for c in probes]
+        q_sq = np.sum(np.square(feats))
+        dists = np.concatenate(
+            [self.feats_sq[start:end] - 2 * (self.feats[start:end] @ feats) + q_sq for start, end in cells])
+        rows = np.concatenate([np.arange(start, end) for start, end in cells])
+
+        indices = top_k(dists, k)
+        out_dists[:len(indices)] = np.sqrt(np.maximum(dists[indices], 0.))
+        out_indices[:len(indices)] = self.ids[rows[indices]]
+        return out_dists, out_indices
+
+    def search_batch(self, feats: npt.ArrayLike, k: int) -> tuple[npt.ArrayLike, npt.ArrayLike]:
+        """Same as `BruteForceIndex.search_batch`, approximate.
+
+        The rows of the probed cells are gathered for every query and ranked with `top_k_batch`. When the probed
+        cells hold fewer than k records, results are padded with inf distances and -1 indices.
+        """
+        feats = np.asarray(feats, dtype=np.float32)
+        out_dists = np.full([len(feats), k], np.inf, dtype=np.float32)
+        out_indices = np.full([len(feats), k], -1, dtype=np.int64)
+
+        c_sq = np.sum(np.square(self.centroids), axis=1)
+        probes = top_k_batch(c_sq - 2 * feats @ self.centroids.T, self.n_probe)
+        n_candidates = np.sum(self.offsets[probes + 1] - self.offsets[probes], axis=1)
+
+        # Bound the gathered [chunk, n_candidates, dim] rows.
+        chunk_size = max(1, self.max_chunk_elements // max(1, n_candidates.max() * self.feats.shape[1]))
+        for start in range(0, len(feats), chunk_size):
+            chunk = feats[start:start + chunk_size]
+            rows = self.probed_rows(probes[start:start + chunk_size])
+            valid = rows >= 0
+            safe_rows = np.where(valid, rows, 0)
+
+            dots = np.matmul(self.feats[safe_rows], chunk[:, :, np.newaxis])[:, :, 0]
+            dists = self.feats_sq[safe_rows] - 2 * dots + np.sum(np.square(chunk), axis=1)[:, np.newaxis]
+            dists = np.where(valid, dists, np.inf)
+
+            indices = top_k_batch(dists, k)
+            top_rows = np.take_along_axis(rows, indices, axis=1)
+            n_found = indices.shape[1]
+            out_dists[start:start + len(chunk), :n_found] = np.sqrt(
+                np.maximum(np.take_along_axis(dists, indices, axis=1), 0.))
+            out_indices[start:start + len(chunk), :n_found] = np.where(top_rows >= 0,
+                                                                        self.ids[np.maximum(top_rows, 0)], -1)
+        return out_dists, out_indices
+
+
+KNN_INDICES = {"brute_force": BruteForceIndex, "ivf": IVFIndex}
+
+
+def get_knn_index(name: str):
+    assert name in KNN_INDICES, f"[ERROR] Unknown KNN index {name}, choose from {list(KNN_INDICES.keys())}."
+    return KNN_INDICES[name]()
+
+
+def recall_at_k(index, exact_index, queries: npt.ArrayLike, k: int) -> float:
+    """Fraction of the exact top-k neighbours that the index also returns."""
+    _, approx_ids = index.search_batch(queries, k)
+    _, exact_ids = exact_index.search_batch(queries, k)
+    # The -1 padding of an approximate index never matches.
+    hits = sum(len(np.intersect1d(approx, exact)) for approx, exact in zip(approx_ids, exact_ids))
+    return hits / float(len(queries) * k)
@@ -10,21 +10,17 @@ from modules import utils
 D_MODEL = 96
 
 
-def get_triu_indicies(batch_size: int, n_joints: int, n_frames: int) -> npt.ArrayLike:
-    """Get half top-right of Euclidean matrix, with batch index. 
+def get_triu_flat_indices(n_joints: int) -> npt.ArrayLike:
+    """Get half top-right of Euclidean matrix, as indices into the flattened matrix.
 
     Args:
-        batch_size (int): Batch size
         n_joints (int): Num joints define matrix rows, cols.
 
     Returns:
-        npt.ArrayLike: 3D array of indices for tf.gather_nd.
+        npt.ArrayLike: 1D array of indices into the last axis of a [..., n_joints * n_joints] tensor.
     """
-    triu_idxs = np.array(np.triu_indices(n_joints))
-    num_member = len(triu_idxs[0])
-    triu_idxs = np.tile(triu_idxs, batch_size * n_frames).transpose()
-    grid = np.mgrid[0:batch_size, 0:n_frames, 0:num_member].reshape(3, -1).transpose()
-    return np.concatenate([grid, triu_idxs], axis=1)[:, [0, 1, 3, 4]]
+    rows, cols = np.triu_indices(n_joints)
+    return (rows * n_joints + cols).astype(np.int32)
 
 
 def batch_cdist(a: tf.Tensor, b: tf.Tensor) -> tf.Tensor:
@@ -47,14 +43,14 @@ def cdist(input: tf.Tensor, gather_idxs: tf.Tensor, ignore_value: tf.Tensor) ->
 
     Args:
         input (tf.Tensor): Input tensor [batch_size, n_frames, n_joints, dim]
-        gather_idxs (tf.Tensor): Top-right indices of Euclidean matrix.
+        gather_idxs (tf.Tensor): Top-right indices of the flattened Euclidean matrix, see `get_triu_flat_indices`.
         ignore_value (tf.Tensor): Replace missing joints with this value.
 
     Returns:
-        tf.Tensor: Euclidean distance matrix.
+        tf.Tensor: Euclidean distance matrix [batch_size, n_frames, n_gather].
     """
-    batch_size = tf.shape(input)[0]
-    n_frames = tf.shape(input)[1]
+    n_frames = input.shape[1]
+    n_joints = input.shape[2]
 
     # Mask out missing joints.
     mask = tf.not_equal(input, ignore_value)
@@ -71,10 +67,10 @@ def cdist(input: tf.Tensor, gather_idxs: tf.Tensor, ignore_value: tf.Tensor) ->
     # Apply mask.
     dist_mat = tf.where(mask_mat, dist_mat, ignore_value)
 
-    # Gather only upper-right half of distance matrix.
-    dist_mat = tf.gather_nd(dist_mat, gather_idxs, batch_dims=0)
+    # Gather only upper-right half of distance matrix, independent of batch size.
+    dist_mat = tf.reshape(dist_mat, shape=[-1, n_frames, n_joints * n_joints])
 
-    return tf.reshape(dist_mat, shape=[batch_size, n_frames, -1])
+    return tf.gather(dist_mat, gather_idxs, axis=-1)
 
 
 @gin.configurable
@@ -95,10 +91,9 @@ def poses_diff(x, ignore_value: tf.Tensor):
 
 
 def pose_motion(raw_poses):
-    batch_size = raw_poses.shape[0]
     diff_slow = poses_diff(raw_poses)
     # flatten last 2 dims.
-    diff_slow = tf.reshape(diff_slow, (batch_size, diff_slow.shape[1], diff_slow.shape[2] * diff_slow.shape[3]))
+    diff_slow = tf.reshape(diff_slow, (-1, diff_slow.shape[1], diff_slow.shape[2] * diff_slow.shape[3]))
 
     return diff_slow
 
@@ -130,10 +125,10 @@ def conv_enc(filters, n_gather, n_frames):
 @gin.configurable
 def get_model(batch_size: int, n_pose_feats: int, n_face_feats: int, n_hand_feats: int, n_classes: int, n_frames: int):
 
-    # top-right Euclidean.
-    gather_pose = get_triu_indicies(batch_size, n_joints=15, n_frames=n_frames)
-    gather_face = get_triu_indicies(batch_size, n_joints=25, n_frames=n_frames)
-    gather_hand = get_triu_indicies(batch_size, n_joints=21, n_frames=n_frames)
+    # top-right Euclidean. batch_size may be None for a dynamic batch dimension.
+    gather_pose = get_triu_flat_indices(n_joints=15)
+    gather_face = get_triu_flat_indices(n_joints=25)
+    gather_hand = get_triu_flat_indices(n_joints=21)
 
     # ------ INPUT --------
     pose_3d = Input(batch_shape=(batch_size, n_frames, 15, 3), name='pose_3d')
@@ -149,7 +144,7 @@ def get_model(batch_size: int, n_pose_feats: int, n_face_feats: int, n_hand_feat
 
     # dist-raw-diff_slow-diff_fast
     pose_dist = cdist(pose_3d_, gather_pose)
-    pose_3d_f = tf.reshape(pose_3d_, [batch_size, n_frames, 15 * 3])
+    pose_3d_f = tf.reshape(pose_3d_, [-1, n_frames, 15 * 3])
     pose_diff_slow = pose_motion(pose_3d_)
 
     # concat pose.
@@ -174,7 +169,7 @@ def get_model(batch_size: int, n_pose_feats: int, n_face_feats: int, n_hand_feat
 
     # left hand.
     lh_dist = cdist(lh_3d_, gather_hand)
-    lh_3d_f = tf.reshape(lh_3d_, [batch_size, n_frames, 21 * 3])
+    lh_3d_f = tf.reshape(lh_3d_, [-1, n_frames, 21 * 3])
     lh_cat = tf.concat([lh_dist, lh_3d_f], axis=-1)
     lh_enc = hand_encoder(lh_cat)
     lh_enc = d1D(lh_enc, 256)
@@ -183,7 +178,7 @@ def get_model(batch_size: int, n_pose_feats: int, n_face_feats: int, n_hand_feat
 
     # right hand.
     rh_dist = cdist(rh_3d_, gather_hand)
-    rh_3d_f = tf.reshape(rh_3d_, [batch_size, n_frames, 21 * 3])
+    rh_3d_f = tf.reshape(rh_3d_, [-1, n_frames, 21 * 3])
     rh_cat = tf.concat([rh_dist, rh_3d_f], axis=-1)
     rh_enc = hand_encoder(rh_cat)
     rh_enc = d1D(rh_enc, 256)
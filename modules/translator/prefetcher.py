@@ -0,0 +1,204 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import multiprocessing
+import queue
+import random
+import time
+import traceback
+import weakref
+from multiprocessing import shared_memory
+
+import gin
+import numpy as np
+import numpy.typing as npt
+
+from .data_generator import DataGenerator
+
+
+def slot_arrays(shm: shared_memory.SharedMemory, specs: list) -> list[npt.ArrayLike]:
+    """Views of the batch arrays stored one after another in a shared memory block."""
+    arrays = []
+    offset = 0
+    for shape, dtype in specs:
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        arrays.append(arr)
+        offset += arr.nbytes
+    return arrays
+
+
+def prefetch_worker(generator: DataGenerator, worker_id: int, seed: int, specs: list, shm_names: list[str],
+                    request_queue: multiprocessing.Queue, done_queue: multiprocessing.Queue):
+    # Forked workers start with the parent's random state, every worker needs its own.
+    random.seed(seed + worker_id)
+    np.random.seed(seed + worker_id)
+
+    # h5 handles opened by the parent can't be shared.
+    if hasattr(generator.skeleton_ds, "reopen"):
+        generator.skeleton_ds.reopen()
+
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    # Pending results are dropped on shutdown instead of blocking the exit.
+    done_queue.cancel_join_thread()
+    try:
+        while True:
+            request = request_queue.get()
+            if request is None:
+                break
+
+            slot, hards = request
+            try:
+                inputs, y_batch = generator.__getitem__(0, hards)
+                for dst, src in zip(slot_arrays(shms[slot], specs), inputs + [y_batch]):
+                    dst[...] = src
+                done_queue.put((slot, None))
+            except Exception:
+                done_queue.put((slot, traceback.format_exc()))
+    finally:
+        for shm in shms:
+            shm.close()
+
+
+def shutdown(workers: list, request_queue: multiprocessing.Queue, shms: list[shared_memory.SharedMemory]):
+    """Stop the workers and free the shared memory slots, of a closed or garbage collected prefetcher."""
+    # Drop pending requests, workers stop after their current batch.
+    try:
+        while True:
+            request_queue.get_nowait()
+    except queue.Empty:
+        pass
+    for _ in workers:
+        request_queue.put(None)
+    for worker in workers:
+        worker.join(timeout=5.)
+        if worker.is_alive():
+            logging.warning(f"Prefetch worker {worker.pid} didn't stop, terminating.")
+            worker.terminate()
+
+    for shm in shms:
+        try:
+            shm.close()
+        except BufferError:
+            # A batch returned by get is still referenced, its mapping goes away with it.
+            pass
+        shm.unlink()
+
+
+@gin.configurable
+class BatchPrefetcher():
+    """Build training batches of a DataGenerator in worker processes, ahead of the train step.
+
+    Batches are written to `prefetch` shared memory slots, so they are never pickled.
+    Each request carries the latest hards, they reach the sampling with a delay of at most `prefetch` batches.
+    Workers and slots are released by `close`, or by a finalizer when the prefetcher is never closed.
+
+    Usage:
+        with BatchPrefetcher(train_generator) as prefetcher:
+            inputs, y_true = prefetcher.get(hards)
+    """
+
+    def __init__(self, generator: DataGenerator, num_workers: int = 4, prefetch: int = 8, seed: int = 0):
+        assert prefetch >= num_workers, "prefetch must be at least num_workers, otherwise workers are idle."
+        self.generator = generator
+        self.num_workers = num_workers
+        self.prefetch = prefetch
+        self.seed = seed
+
+        # Batch layout, from one batch built here.
+        inputs, y_batch = generator.__getitem__(0, None)
+        self.specs = [(arr.shape, arr.dtype) for arr in inputs + [y_batch]]
+        slot_bytes = sum(arr.nbytes for arr in inputs + [y_batch])
+
+        self.shms = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(prefetch)]
+        self.slots = [slot_arrays(shm, self.specs) for shm in self.shms]
+
+        # Fork, the workers inherit the generator and its dataset without pickling.
+        ctx = multiprocessing.get_context("fork")
+        self.request_queue = ctx.Queue()
+        self.done_queue = ctx.Queue()
+        self.workers = []
+        # Registered before the workers start, the slots are unlinked even if a start fails, and on exit or
+        # when the prefetcher is collected, e.g. a notebook cell interrupted before close.
+        self.finalizer = weakref.finalize(self, shutdown, self.workers, self.request_queue, self.shms)
+        for i in range(num_workers):
+            worker = ctx.Process(target=prefetch_worker,
+                                 args=(generator, i, seed, self.specs, [shm.name for shm in self.shms],
+                                       self.request_queue, self.done_queue),
+                                 daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        for slot in range(prefetch):
+            self.request_queue.put((slot, None))
+
+        # Slot returned by the last get, refilled on the next one.
+        self.current_slot = None
+        self.wait_times = []
+
+    def get(self, hards: list[int] = None) -> tuple[list[npt.ArrayLike], npt.ArrayLike]:
+        """Next batch, same output as DataGenerator.__getitem__.
+
+        The arrays are views of a shared slot, valid until the next call.
+        """
+        if self.current_slot is not None:
+            self.request_queue.put((self.current_slot, hards))
+            self.current_slot = None
+
+        t1 = time.perf_counter()
+        while True:
+            try:
+                slot, error = self.done_queue.get(timeout=1.)
+                break
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("A prefetch worker died.")
+        self.wait_times.append(time.perf_counter() - t1)
+
+        if error is not None:
+            raise RuntimeError(f"Prefetch worker failed:\n{error}")
+
+        self.current_slot = slot
+        arrays = self.slots[slot]
+        return arrays[:-1], arrays[-1]
+
+    def last_wait(self) -> float:
+        """Seconds the last get waited for a batch."""
+        return self.wait_times[-1] if len(self.wait_times) > 0 else 0.
+
+    def wait_report(self, starved_thres: float = 1e-3) -> dict:
+        """Input wait statistics since the last call, in milliseconds."""
+        waits = np.array(self.wait_times) * 1000
+        self.wait_times = []
+        if len(waits) == 0:
+            return {}
+        return {
+            "steps": len(waits),
+            "mean_ms": float(np.mean(waits)),
+            "p95_ms": float(np.percentile(waits, 95)),
+            "max_ms": float(np.max(waits)),
+            "starved_steps": int(np.sum(waits > starved_thres * 1000)),
+        }
+
+    def close(self):
+        # Views of the slots first, a shared memory block can't be closed while they exist.
+        self.slots = []
+        # Runs shutdown once, later calls and the finalizer do nothing.
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
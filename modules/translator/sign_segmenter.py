@@ -0,0 +1,128 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+import gin
+import numpy as np
+
+# HolisticManager sets joints of undetected parts to 0.
+MISSING_VALUE = 0.
+
+
+@gin.configurable
+class SignSegmenter():
+    """Find where signs start and end in a stream of holistic results, from hand presence and wrist motion.
+
+    A sign starts after `start_frames` consecutive frames with a visible hand whose wrist moves faster than
+    `start_thres` shoulder widths per frame. It ends after `end_frames` consecutive frames without a hand or
+    slower than `end_thres`, or after `max_frames` frames. The lower end threshold keeps short holds in the sign.
+    """
+
+    def __init__(self,
+                 lh_inpose: list[int],
+                 rh_inpose: list[int],
+                 l_shoulder: int,
+                 r_shoulder: int,
+                 start_thres: float = 0.03,
+                 end_thres: float = 0.015,
+                 start_frames: int = 3,
+                 end_frames: int = 10,
+                 pre_frames: int = 5,
+                 min_frames: int = 16,
+                 max_frames: int = 120):
+        # The first joint of the hand in pose is the wrist.
+        self.wrists = [lh_inpose[0], rh_inpose[0]]
+        self.l_shoulder = l_shoulder
+        self.r_shoulder = r_shoulder
+        self.start_thres = start_thres
+        self.end_thres = end_thres
+        self.start_frames = start_frames
+        self.end_frames = end_frames
+        self.pre_frames = pre_frames
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.reset()
+
+    def reset(self):
+        self.n_seen = 0
+        self.prev_wrists = None
+        self.prev_visible = np.zeros(2, dtype=bool)
+        self.last_end = 0
+        self.start = None
+        self.n_active = 0
+        self.n_inactive = 0
+
+    @property
+    def is_active(self) -> bool:
+        """A sign is in progress."""
+        return self.start is not None
+
+    def motion(self, frame_res: dict) -> float:
+        """Fastest wrist displacement of the visible hands since the previous frame, in shoulder widths.
+
+        Returns -1 if no hand is visible.
+        """
+        pose = frame_res["pose_4d"]
+        wrists = pose[self.wrists, :2]
+        visible = np.array([frame_res["lh_3d"][0, 0] != MISSING_VALUE, frame_res["rh_3d"][0, 0] != MISSING_VALUE])
+        prev_wrists, self.prev_wrists = self.prev_wrists, wrists
+        prev_visible, self.prev_visible = self.prev_visible, visible
+        if not np.any(visible):
+            return -1.
+
+        # Only hands visible in both frames, a hand coming into view is not a motion.
+        tracked = visible & prev_visible
+        unit = np.linalg.norm(pose[self.l_shoulder, :2] - pose[self.r_shoulder, :2])
+        if not np.any(tracked) or unit == 0.:
+            return 0.
+        displacement = np.linalg.norm(wrists - prev_wrists, axis=1) / unit
+        return float(np.max(displacement[tracked]))
+
+    def update(self, frame_res: dict):
+        """Feed the next frame.
+
+        Returns:
+            tuple: Absolute frame range [start, end) of a sign that just ended, otherwise None.
+        """
+        idx = self.n_seen
+        self.n_seen += 1
+        motion = self.motion(frame_res)
+
+        if self.start is None:
+            self.n_active = self.n_active + 1 if motion > self.start_thres else 0
+            if self.n_active >= self.start_frames:
+                # Leading frames, without overlapping the previous sign.
+                self.start = max(self.last_end, idx + 1 - self.start_frames - self.pre_frames)
+                self.n_inactive = 0
+            return None
+
+        self.n_inactive = self.n_inactive + 1 if motion < self.end_thres else 0
+        if self.n_inactive >= self.end_frames:
+            # Up to the last active frame.
+            end = idx + 1 - self.n_inactive
+        elif idx + 1 - self.start >= self.max_frames:
+            end = idx + 1
+        else:
+            return None
+
+        start = self.start
+        self.start = None
+        self.n_active = 0
+        self.last_end = end
+
+        if end - start < self.min_frames:
+            logging.debug(f"Segment [{start}, {end}) too short, dropped.")
+            return None
+        return start, end
@@ -0,0 +1,96 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from collections import deque
+
+import gin
+import numpy as np
+
+from modules import utils
+
+from .translator_manager import TranslatorManager
+
+
+@gin.configurable
+class StreamingTranslator():
+    """Sliding-window translation of a stream of holistic results.
+
+    Frames are filtered once, when they enter a ring buffer of `window` frames. Every `stride` frames,
+    `n_frames` are sampled uniformly from the buffer and classified. Memory and prediction cost are fixed,
+    however long the stream runs.
+    """
+
+    def __init__(self,
+                 translator_manager: TranslatorManager,
+                 ignore_value: float,
+                 window: int = 48,
+                 stride: int = 8,
+                 k: int = 5,
+                 n_latencies: int = 1000):
+        assert window >= translator_manager.n_frames, "[ERROR] window is shorter than the model input."
+        self.translator_manager = translator_manager
+        self.window = window
+        self.stride = stride
+        self.k = k
+        self.ignore_value = ignore_value
+
+        self.ring_buffer = utils.ring_buffer.SkeletonRingBuffer(capacity=window, filtered=True)
+        # Seconds per prediction, for the last `n_latencies` predictions.
+        self.latencies = deque(maxlen=n_latencies)
+
+    def reset(self):
+        self.ring_buffer.clear()
+
+    def update(self, frame_res: dict):
+        """Feed the next frame.
+
+        Returns:
+            str: Predicted gloss over the latest window, only every `stride` frames and if a hand is visible.
+        """
+        self.ring_buffer.append(frame_res)
+
+        n_frames = self.translator_manager.n_frames
+        n_buffered = len(self.ring_buffer)
+        if n_buffered < n_frames or self.ring_buffer.total % self.stride != 0:
+            return None
+
+        t1 = time.perf_counter()
+
+        # Only the sampled frames are gathered, they are already filtered.
+        indices = self.ring_buffer.first + utils.skeleton_utils.uniform_sampling(n_buffered, n_frames)
+        vid_res = self.ring_buffer.get_frames(indices)
+
+        # No hand in the window, nothing is signed.
+        if np.all(vid_res["lh_frames"] == self.ignore_value) and np.all(vid_res["rh_frames"] == self.ignore_value):
+            return None
+
+        feats = self.translator_manager.get_feats_sampled(vid_res)
+        res_txt = self.translator_manager.run_knn(feats, k=self.k)
+
+        self.latencies.append(time.perf_counter() - t1)
+        return res_txt
+
+    def latency_report(self) -> dict:
+        """Prediction latency percentiles in milliseconds."""
+        if len(self.latencies) == 0:
+            return {}
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "predictions": len(latencies),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(np.max(latencies)),
+        }
@@ -18,95 +18,174 @@ from pathlib import Path
 import gin
 import numpy as np
 import numpy.typing as npt
-import tensorflow as tf
 
 from modules import utils
 
-from . import augmentation, model
+from . import augmentation, feature_encoder, knn_database, knn_index
 
 
 @gin.configurable
 class TranslatorManager():
 
-    def __init__(self, model_path: str, labels: dict, knn_dir: str, n_frames: int) -> None:
+    def __init__(self,
+                 model_path: str,
+                 labels: dict,
+                 knn_dir: str,
+                 n_frames: int,
+                 knn_index_name: str = "brute_force",
+                 feats_batch_size: int = 64) -> None:
         self.n_frames = n_frames
         self.softmax_labels = labels
         self.knn_dir = Path(knn_dir)
         self.knn_dir.mkdir(parents=True, exist_ok=True)
 
-        self.model = model.get_model()
-        self.model.load_weights(model_path)
-        self.model = tf.function(self.model)
+        # Keras h5 weights, or a SavedModel / TFLite export of scripts.export_translator.
+        self.encoder = feature_encoder.get_encoder(model_path)
+        assert self.encoder.n_frames == n_frames, \
+            f"[ERROR] {model_path} takes {self.encoder.n_frames} frames, not {n_frames}."
+
+        self.feats_batch_size = feats_batch_size
+
+        self.knn_store = knn_database.KnnDatabase(self.knn_dir)
+        # Convert old per-gloss txt files once.
+        knn_database.migrate_txt_database(self.knn_dir)
 
         self.knn_database = []
-        self.knn_labels = []
+        self.knn_label_ids = []
+        self.knn_glosses = []
+        self.knn_index_name = knn_index_name
+        self.knn_index = None
+        self.knn_version = None
+
+    def warmup(self):
+        """Run the encoder once on a dummy clip, so the first prediction doesn't pay for the trace."""
+        self.encoder([np.zeros([1, self.n_frames, n, 3], dtype=np.float32) for n in feature_encoder.INPUT_JOINTS])
 
     def load_knn_database(self):
         logging.info("Reading database...")
 
-        txt_files = list(Path(self.knn_dir).glob("*.txt"))
-
-        if len(txt_files) == 0:
+        if len(self.knn_store) == 0:
             return False
 
-        knn_database = []
-        knn_labels = []
-
-        for txt in txt_files:
-            arr = np.loadtxt(txt)
-            knn_database.extend(arr)
-            knn_labels.extend([txt.stem] * len(arr))
-
-        self.knn_database = np.stack(knn_database)
-        self.knn_labels = np.array(knn_labels)
+        # Unchanged since the last load, e.g. when switching back to play mode.
+        version = self.knn_store.version()
+        if self.knn_index is not None and version == self.knn_version:
+            return True
+
+        self.knn_database, self.knn_label_ids, self.knn_glosses = self.knn_store.load()
+        # The index saved next to the store is rebuilt only when the store changed.
+        index = knn_index.get_knn_index(self.knn_index_name)
+        if not index.load(self.knn_dir, version):
+            index.build(self.knn_database, index_dir=self.knn_dir, version=version)
+        self.knn_index = index
+        self.knn_version = version
+        # Alphabetical rank of glosses, to break vote ties the same way as np.unique.
+        self.knn_gloss_rank = np.argsort(np.argsort(self.knn_glosses))
 
         return True
 
     def save_knn_database(self, gloss_name, knn_records):
-        output_path = Path(self.knn_dir, gloss_name + ".txt")
-
-        knn_feats = []
-        if output_path.is_file():
-            old_feats = np.loadtxt(output_path)
-            knn_feats.extend(old_feats)
-
-        knn_feats.extend(knn_records)
-        np.savetxt(output_path, knn_feats, fmt='%.8f')
+        self.knn_store.append(gloss_name, knn_records)
 
     def preprocess_input(self, vid_res: dict, resampling: int):
-        # Remove non-visible joints.
-        vid_res = utils.skeleton_utils.filter_visibility(vid_res)
-        if resampling > 0:
-            indices = utils.skeleton_utils.uniform_sampling(vid_res["n_frames"], n_pick=resampling)
-            vid_res["n_frames"] = resampling
-            vid_res = utils.skeleton_utils.apply_resampling(vid_res, indices)
+        with utils.profiling.stage("translator.preprocess_input"):
+            # Resample first, then filter only the picked frames. Neither step modifies the input.
+            if resampling > 0:
+                indices = utils.skeleton_utils.uniform_sampling(vid_res["n_frames"], n_pick=resampling)
+                vid_res = utils.skeleton_utils.apply_resampling(vid_res, indices)
+
+            # Remove non-visible joints, unless read from the filter cache.
+            if not utils.filter_cache.is_filtered(vid_res):
+                vid_res = utils.skeleton_utils.filter_visibility(vid_res)
 
-        return vid_res
+            return vid_res
 
     def get_feats(self, vid_res: dict, is_augment=False):
-        vid_res = self.preprocess_input(vid_res, self.n_frames)
+        with utils.profiling.stage("translator.get_feats"):
+            vid_res = self.preprocess_input(vid_res, self.n_frames)
+
+            if is_augment:
+                vid_res = augmentation.augment_video(vid_res)
+
+            return self.get_feats_sampled(vid_res)
+
+    def get_feats_sampled(self, vid_res: dict):
+        """Features of a clip already resampled to `n_frames` and filtered."""
+        with utils.profiling.stage("translator.model"):
+            feats_out = self.encoder([
+                vid_res["pose_frames"][np.newaxis], vid_res["face_frames"][np.newaxis],
+                vid_res["lh_frames"][np.newaxis], vid_res["rh_frames"][np.newaxis]
+            ])
+            return feats_out.squeeze()
+
+    def get_feats_batch(self, vid_res_list: list[dict], is_augment=False) -> npt.ArrayLike:
+        """Same as `get_feats` for many videos, run in batches of `feats_batch_size`.
+
+        Returns:
+            npt.ArrayLike: Features [len(vid_res_list), D].
+        """
+        if len(vid_res_list) == 0:
+            return np.zeros([0, 0], dtype=np.float32)
+
+        bs = self.feats_batch_size
+
+        inputs = {"pose_frames": [], "face_frames": [], "lh_frames": [], "rh_frames": []}
+        for vid_res in vid_res_list:
+            vid_res = self.preprocess_input(vid_res, self.n_frames)
+            for part in inputs.keys():
+                inputs[part].append(vid_res[part])
+
+        for part in inputs.keys():
+            inputs[part] = np.stack(inputs[part]).astype(np.float32)
 
         if is_augment:
-            vid_res = augmentation.augment_video(vid_res)
+            inputs = augmentation.augment_batch(inputs)
+
+        feats = []
+        for start in range(0, len(vid_res_list), bs):
+            feats.append(
+                self.encoder([
+                    inputs["pose_frames"][start:start + bs], inputs["face_frames"][start:start + bs],
+                    inputs["lh_frames"][start:start + bs], inputs["rh_frames"][start:start + bs]
+                ]))
 
-        feats_out, cls_out = self.model([
-            vid_res["pose_frames"][np.newaxis], vid_res["face_frames"][np.newaxis], vid_res["lh_frames"][np.newaxis],
-            vid_res["rh_frames"][np.newaxis]
-        ])
-        return feats_out.numpy().squeeze()
+        return np.concatenate(feats)
+
+    def get_label_ids(self, top_indices: npt.ArrayLike) -> npt.ArrayLike:
+        """Label index of record indices, -1 stays -1 (padding of an IVF search)."""
+        label_ids = np.asarray(self.knn_label_ids[np.maximum(top_indices, 0).ravel()]).reshape(top_indices.shape)
+        return np.where(top_indices >= 0, label_ids, -1)
+
+    def get_glosses(self, label_ids: npt.ArrayLike) -> npt.ArrayLike:
+        """Gloss name of label indices, "" for -1."""
+        return np.where(label_ids >= 0, self.knn_glosses[np.maximum(label_ids, 0)], "")
 
     def run_knn(self, feats: npt.ArrayLike, k=5):
+        with utils.profiling.stage("translator.run_knn"):
+            # top k nearst samples.
+            _, top_indices = self.knn_index.search(feats, k)
+            top_label_ids = self.get_label_ids(top_indices)
+
+            # mode.
+            label_ids, _ = knn_index.mode_vote(top_label_ids[np.newaxis], self.knn_gloss_rank)
+            res_txt = self.get_glosses(label_ids)[0]
+
+            return res_txt
+
+    def run_knn_batch(self, feats: npt.ArrayLike, k=5):
+        """Classify many feature vectors in one pass.
 
-        dists = np.square(self.knn_database - feats)
-        dists = np.sqrt(np.sum(dists, axis=-1))
+        Args:
+            feats (npt.ArrayLike): Feature vectors [N, D].
+            k (int, optional): Number of neighbours. Defaults to 5.
 
-        # top k nearst samples.
-        top_indices = np.argsort(dists)[:k]
-        top_lables = self.knn_labels[top_indices]
+        Returns:
+            tuple: Voted gloss [N], top-k glosses [N, k], top-k distances [N, k], votes of the voted gloss [N].
+                Missing neighbours of an IVF search have an empty gloss and an inf distance.
+        """
+        top_dists, top_indices = self.knn_index.search_batch(feats, k)
+        top_label_ids = self.get_label_ids(top_indices)
 
-        # mode.
-        vals, counts = np.unique(top_lables, return_counts=True)
-        index = np.argmax(counts)
-        res_txt = vals[index]
+        label_ids, votes = knn_index.mode_vote(top_label_ids, self.knn_gloss_rank)
 
-        return res_txt
+        return self.get_glosses(label_ids), self.get_glosses(top_label_ids), top_dists, votes
@@ -12,4 +12,4 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from . import crop_utils, file_utils, skeleton_utils
+from . import crop_utils, file_utils, filter_cache, profiling, realtime, ring_buffer, skeleton_utils, video_reader
@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 from pathlib import Path
 
 import h5py
@@ -6,11 +7,21 @@ import numpy as np
 from tqdm import tqdm
 
 
+BODY_PARTS = ["pose_frames", "face_frames", "lh_frames", "rh_frames"]
+
+# v2 layout, one concatenated dataset per body part.
+FORMAT_VERSION_V2 = 2
+CHUNK_FRAMES = 256
+
+
 def open_dataset_h5(fpath: Path) -> list[dict]:
     """
 	Open dataset file in h5 format.
 	each file contain multiple videos.
 	"""
+    if is_dataset_v2(fpath):
+        return open_dataset_h5_v2(fpath)
+
     out_data = []
     with h5py.File(fpath, 'r') as f:
 
@@ -23,19 +34,212 @@ def open_dataset_h5(fpath: Path) -> list[dict]:
     return out_data
 
 
+def write_video_group(f: h5py.File, name: str, res: dict):
+    dict_group = f.create_group(name)
+
+    dict_group.create_dataset("pose_frames", data=res["pose_frames"])
+    dict_group.create_dataset("face_frames", data=res["face_frames"])
+    dict_group.create_dataset("lh_frames", data=res["lh_frames"])
+    dict_group.create_dataset("rh_frames", data=res["rh_frames"])
+    dict_group.create_dataset("n_frames", data=res["n_frames"])
+
+
 def write_dataset_h5(fpath: Path, videos: list[dict]):
 
     fpath.parent.mkdir(parents=True, exist_ok=True)
 
     with h5py.File(fpath, 'w') as f:
         for i, res in enumerate(videos):
-            dict_group = f.create_group(str(i))
+            write_video_group(f, str(i), res)
+
+
+def append_dataset_h5(fpath: Path, videos: list[dict]) -> list[str]:
+    """
+	Append videos to a dataset file in place, existing groups are not rewritten.
+	Returns the names of the new groups.
+	"""
+    if is_dataset_v2(fpath):
+        return [str(i) for i in append_dataset_h5_v2(fpath, videos)]
+
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+
+    with h5py.File(fpath, 'a') as f:
+        next_id = max([int(k) for k in f.keys()], default=-1) + 1
+        names = [str(next_id + i) for i in range(len(videos))]
+        for name, res in zip(names, videos):
+            write_video_group(f, name, res)
+
+    return names
+
+
+def delete_groups_h5(fpath: Path, names: list[str]):
+    if not fpath.is_file():
+        return
+
+    if is_dataset_v2(fpath):
+        delete_clips_h5_v2(fpath, [int(name) for name in names])
+        return
+
+    with h5py.File(fpath, 'a') as f:
+        for name in names:
+            if name in f:
+                del f[name]
+
+
+def next_group_h5(fpath: Path) -> int:
+    """Name, as an int, of the next group appended to a dataset file of either layout."""
+    if not Path(fpath).is_file():
+        return 0
+    v2 = is_dataset_v2(fpath)
+    with h5py.File(fpath, 'r') as f:
+        if v2:
+            return len(f["offsets"]) - 1
+        return max([int(k) for k in f.keys()], default=-1) + 1
+
+
+def groups_from_h5(fpath: Path, first: int) -> list[str]:
+    """Names of the groups from `first` on, i.e. appended since `next_group_h5` returned `first`."""
+    if not Path(fpath).is_file():
+        return []
+    v2 = is_dataset_v2(fpath)
+    with h5py.File(fpath, 'r') as f:
+        if v2:
+            return [str(i) for i in range(first, len(f["offsets"]) - 1)]
+        return [k for k in f.keys() if int(k) >= first]
+
+
+## ─── V2 LAYOUT ───────────────────────────────────────────────────────────
+#
+# /pose_frames, /face_frames, /lh_frames, /rh_frames
+#     [total_frames, J, C] resizable, chunked along frames, optionally compressed.
+# /offsets
+#     [n_clips + 1] start frame of every clip, clip i is frames offsets[i]:offsets[i + 1].
+# /valid
+#     [n_clips] 0 for deleted clips, the data is kept until the file is converted again.
+
+
+def is_dataset_v2(fpath: Path) -> bool:
+    if not Path(fpath).is_file():
+        return False
+    with h5py.File(fpath, 'r') as f:
+        return f.attrs.get("format_version", 1) == FORMAT_VERSION_V2
+
+
+def create_dataset_h5_v2(fpath: Path, part_shapes: dict, compression: str = None):
+    """
+	Create an empty v2 file.
+	part_shapes maps each body part to its (J, C) shape.
+	"""
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+
+    with h5py.File(fpath, 'w') as f:
+        f.attrs["format_version"] = FORMAT_VERSION_V2
+        for part in BODY_PARTS:
+            shape = tuple(part_shapes[part])
+            f.create_dataset(part,
+                             shape=(0,) + shape,
+                             maxshape=(None,) + shape,
+                             chunks=(CHUNK_FRAMES,) + shape,
+                             dtype=np.float32,
+                             compression=compression)
+        f.create_dataset("offsets", data=np.zeros([1], dtype=np.int64), maxshape=(None,), chunks=(1024,))
+        f.create_dataset("valid", shape=(0,), maxshape=(None,), chunks=(1024,), dtype=np.uint8)
+
+
+def append_dataset_h5_v2(fpath: Path, videos: list[dict], compression: str = None) -> list[int]:
+    """
+	Append videos to a v2 file, creating it if needed.
+	Returns the indices of the new clips.
+	"""
+    if len(videos) == 0:
+        return []
+
+    if not fpath.is_file():
+        create_dataset_h5_v2(fpath, {part: videos[0][part].shape[1:] for part in BODY_PARTS}, compression)
+
+    with h5py.File(fpath, 'a') as f:
+        offsets = f["offsets"]
+        n_clips = len(offsets) - 1
+        start = int(offsets[-1])
+        n_frames = [len(res["pose_frames"]) for res in videos]
+        total = int(np.sum(n_frames))
+
+        for part in BODY_PARTS:
+            ds = f[part]
+            ds.resize(start + total, axis=0)
+            ds[start:start + total] = np.concatenate([res[part] for res in videos]).astype(np.float32)
+
+        offsets.resize(n_clips + 1 + len(videos), axis=0)
+        offsets[n_clips + 1:] = start + np.cumsum(n_frames)
+
+        valid = f["valid"]
+        valid.resize(n_clips + len(videos), axis=0)
+        valid[n_clips:] = 1
+
+    return list(range(n_clips, n_clips + len(videos)))
+
 
-            dict_group.create_dataset("pose_frames", data=res["pose_frames"])
-            dict_group.create_dataset("face_frames", data=res["face_frames"])
-            dict_group.create_dataset("lh_frames", data=res["lh_frames"])
-            dict_group.create_dataset("rh_frames", data=res["rh_frames"])
-            dict_group.create_dataset("n_frames", data=res["n_frames"])
+def delete_clips_h5_v2(fpath: Path, indices: list[int]):
+    with h5py.File(fpath, 'a') as f:
+        valid = f["valid"]
+        for i in indices:
+            if i < len(valid):
+                valid[i] = 0
+
+
+class SkeletonH5V2():
+    """
+	Lazy reader of a v2 file, clips are only read when indexed.
+	"""
+
+    def __init__(self, fpath: Path):
+        self.fpath = Path(fpath)
+        self.f = h5py.File(self.fpath, 'r')
+        self.offsets = self.f["offsets"][()]
+        # Indices of clips that were not deleted.
+        self.clip_ids = np.flatnonzero(self.f["valid"][()])
+
+    def __len__(self) -> int:
+        return len(self.clip_ids)
+
+    def __getitem__(self, i: int) -> dict:
+        clip_id = self.clip_ids[i]
+        start, end = int(self.offsets[clip_id]), int(self.offsets[clip_id + 1])
+        vid_res = {part: self.f[part][start:end] for part in BODY_PARTS}
+        vid_res["n_frames"] = end - start
+        return vid_res
+
+    def n_frames(self, i: int) -> int:
+        clip_id = self.clip_ids[i]
+        return int(self.offsets[clip_id + 1] - self.offsets[clip_id])
+
+    def close(self):
+        self.f.close()
+
+
+def open_dataset_h5_v2(fpath: Path) -> list[dict]:
+    reader = SkeletonH5V2(fpath)
+    # Read each part once, then split into clips.
+    parts = {part: reader.f[part][()] for part in BODY_PARTS}
+    out_data = []
+    for clip_id in reader.clip_ids:
+        start, end = int(reader.offsets[clip_id]), int(reader.offsets[clip_id + 1])
+        vid_res = {part: parts[part][start:end] for part in BODY_PARTS}
+        vid_res["n_frames"] = end - start
+        out_data.append(vid_res)
+    reader.close()
+    return out_data
+
+
+def convert_h5_v1_to_v2(src: Path, dst: Path, compression: str = None):
+    videos = open_dataset_h5(src)
+    assert len(videos) > 0, f"[ERROR] no videos in {src}."
+    create_dataset_h5_v2(dst, {part: videos[0][part].shape[1:] for part in BODY_PARTS}, compression)
+    append_dataset_h5_v2(dst, videos)
+
+
+def convert_h5_v2_to_v1(src: Path, dst: Path):
+    write_dataset_h5(dst, open_dataset_h5_v2(src))
 
 
 def load_skeleton_h5(folder: Path) -> dict:
@@ -51,6 +255,97 @@ def load_skeleton_h5(folder: Path) -> dict:
     return kp_database
 
 
+class SkeletonH5V1():
+    """
+	Lazy reader of a v1 file, same interface as SkeletonH5V2.
+	"""
+
+    def __init__(self, fpath: Path):
+        self.fpath = Path(fpath)
+        self.f = h5py.File(self.fpath, 'r')
+        self.names = list(self.f.keys())
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, i: int) -> dict:
+        group = self.f[self.names[i]]
+        return {k: group[k][()] for k in group.keys()}
+
+    def close(self):
+        self.f.close()
+
+
+class LazyClipList():
+    """
+	List-like view of the clips of one gloss, for random.choice and len.
+	"""
+
+    def __init__(self, dataset, gloss: str):
+        self.dataset = dataset
+        self.gloss = gloss
+
+    def __len__(self) -> int:
+        return len(self.dataset.readers[self.gloss])
+
+    def __getitem__(self, i: int) -> dict:
+        return self.dataset.get_clip(self.gloss, i)
+
+
+class LazySkeletonDataset():
+    """
+	Same mapping as load_skeleton_h5, {gloss: clips}, but clips are read from the
+	open h5 files only when accessed. Up to cache_size clips are kept in an LRU cache.
+	"""
+
+    def __init__(self, folder: Path, cache_size: int = 0):
+        all_h5 = [v for v in folder.glob("*.h5")]
+        logging.info(f"Globing {folder} Found {len(all_h5)} files.")
+        assert len(all_h5) > 0, f"[ERROR] no .h5 files were found in {folder}."
+
+        self.readers = {}
+        for h5_path in all_h5:
+            reader = SkeletonH5V2 if is_dataset_v2(h5_path) else SkeletonH5V1
+            self.readers[h5_path.stem] = reader(h5_path)
+
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def get_clip(self, gloss: str, i: int) -> dict:
+        key = (gloss, i)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        clip = self.readers[gloss][i]
+        if self.cache_size > 0:
+            self.cache[key] = clip
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return clip
+
+    def keys(self):
+        return self.readers.keys()
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __len__(self) -> int:
+        return len(self.readers)
+
+    def __getitem__(self, gloss: str) -> LazyClipList:
+        return LazyClipList(self, gloss)
+
+    def reopen(self):
+        """New h5 handles, for use in a forked process instead of the parent's ones."""
+        self.readers = {gloss: type(reader)(reader.fpath) for gloss, reader in self.readers.items()}
+        self.cache.clear()
+
+    def close(self):
+        for reader in self.readers.values():
+            reader.close()
+
+
 def load_latents_npy(folder: Path) -> dict:
     all_npy = [v for v in folder.glob("*.npy")]
     num_npy = len(all_npy)
@@ -0,0 +1,91 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import gin
+import h5py
+from tqdm import tqdm
+
+from . import file_utils, skeleton_utils
+
+CACHE_PREFIX = "filtered-"
+
+
+def filter_cache_key() -> str:
+    """Hash of the gin parameters of filter_visibility, a new config gets a new cache."""
+    params = gin.get_bindings(skeleton_utils.filter_visibility)
+    params = {k: params[k] for k in ["bp_hand_thres", "lh_inpose", "rh_inpose", "ignore_value"]}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def is_filtered(vid_res: dict) -> bool:
+    """Filtered clips have no visibility channel in pose_frames."""
+    return vid_res["pose_frames"].shape[-1] == 3
+
+
+def is_cache_valid(src: Path, dst: Path) -> bool:
+    if not dst.is_file():
+        return False
+    stat = src.stat()
+    with h5py.File(dst, 'r') as f:
+        return f.attrs.get("src_size") == stat.st_size and f.attrs.get("src_mtime") == stat.st_mtime
+
+
+def build_filter_cache(folder: Path) -> Path:
+    """Apply filter_visibility once to every clip of every h5 in `folder`.
+
+    Results are written in the v2 layout to `folder/filtered-<key>/`, and only rebuilt for h5 files that changed.
+
+    Returns:
+        Path: Folder of the filtered h5 files, loadable with load_skeleton_h5.
+    """
+    folder = Path(folder)
+    cache_dir = folder / (CACHE_PREFIX + filter_cache_key())
+
+    all_h5 = [v for v in folder.glob("*.h5")]
+    assert len(all_h5) > 0, f"[ERROR] no .h5 files were found in {folder}."
+
+    todo = [h5_path for h5_path in all_h5 if not is_cache_valid(h5_path, cache_dir / h5_path.name)]
+    logging.info(f"Filter cache {cache_dir}: {len(all_h5) - len(todo)} up to date, {len(todo)} to build.")
+
+    for h5_path in tqdm(todo, leave=False):
+        dst = cache_dir / h5_path.name
+        filtered = [skeleton_utils.filter_visibility(vid_res) for vid_res in file_utils.open_dataset_h5(h5_path)]
+        if len(filtered) == 0:
+            continue
+
+        # Write to a temporary file, an interrupted build never leaves a valid looking cache.
+        tmp = dst.with_suffix(".tmp")
+        if tmp.is_file():
+            tmp.unlink()
+        file_utils.append_dataset_h5_v2(tmp, filtered)
+        stat = h5_path.stat()
+        with h5py.File(tmp, 'a') as f:
+            f.attrs["src_size"] = stat.st_size
+            f.attrs["src_mtime"] = stat.st_mtime
+        if dst.is_file():
+            dst.unlink()
+        tmp.rename(dst)
+
+    # Drop results of removed h5 files.
+    src_names = set(h5_path.name for h5_path in all_h5)
+    for cached in cache_dir.glob("*.h5"):
+        if cached.name not in src_names:
+            cached.unlink()
+
+    return cache_dir
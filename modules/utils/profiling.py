@@ -0,0 +1,161 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+import csv
+import json
+import logging
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import gin
+import numpy as np
+
+REPORT_FIELDS = ["stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+
+class StageTimer():
+    __slots__ = ["profiler", "name", "t1"]
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.t1 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.profiler.record(self.name, time.perf_counter() - self.t1)
+
+
+class NullTimer():
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+@gin.configurable
+class LatencyProfiler():
+    """Rolling latency percentiles of named pipeline stages, over the last `window` calls of each stage.
+
+    Disabled, `stage` returns a shared no-op timer. Enabled, the report is written to `report_path` on exit,
+    as JSON or CSV depending on the suffix, or logged as text if there is no path.
+    """
+
+    def __init__(self, enabled: bool = False, window: int = 1000, report_path: str = None):
+        self.enabled = enabled
+        self.window = window
+        self.latencies = {}
+        self.counts = {}
+        # Stages run in the capture, inference and GUI threads.
+        self.lock = threading.Lock()
+
+        if enabled:
+            atexit.register(self.dump, report_path)
+
+    def stage(self, name: str):
+        """Context manager timing one call of the stage `name`."""
+        return StageTimer(self, name) if self.enabled else NULL_TIMER
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            if name not in self.latencies:
+                self.latencies[name] = deque(maxlen=self.window)
+                self.counts[name] = 0
+            self.latencies[name].append(seconds)
+            self.counts[name] += 1
+
+    def reset(self):
+        with self.lock:
+            self.latencies = {}
+            self.counts = {}
+
+    def report(self) -> list[dict]:
+        """One row per stage, in order of first call."""
+        with self.lock:
+            stages = [(name, np.array(latencies) * 1000, self.counts[name]) for name, latencies in self.latencies.items()]
+
+        rows = []
+        for name, latencies, count in stages:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            rows.append({
+                "stage": name,
+                "count": count,
+                "mean_ms": float(np.mean(latencies)),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(np.max(latencies)),
+            })
+        return rows
+
+    def to_text(self) -> str:
+        lines = [f"{'stage':32s} {'count':>8s} {'mean':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  (ms)"]
+        for row in self.report():
+            lines.append(f"{row['stage']:32s} {row['count']:8d} {row['mean_ms']:8.2f} {row['p50_ms']:8.2f} "
+                         f"{row['p95_ms']:8.2f} {row['p99_ms']:8.2f} {row['max_ms']:8.2f}")
+        return "\n".join(lines)
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = self.report()
+        if path.suffix == ".json":
+            with open(path, "w") as f:
+                json.dump(rows, f, indent=2)
+        elif path.suffix == ".csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, "w") as f:
+                f.write(self.to_text() + "\n")
+
+    def dump(self, report_path: str = None):
+        if len(self.latencies) == 0:
+            return
+        if report_path is None:
+            logging.info("Stage latencies:\n" + self.to_text())
+        else:
+            self.save(report_path)
+            logging.info(f"Stage latencies written to {report_path}.")
+
+
+profiler = None
+profiler_lock = threading.Lock()
+
+
+def get_profiler() -> LatencyProfiler:
+    """Shared profiler, created on first use so the gin config is already parsed."""
+    global profiler
+    if profiler is None:
+        with profiler_lock:
+            if profiler is None:
+                profiler = LatencyProfiler()
+    return profiler
+
+
+def stage(name: str):
+    """Time a block with the shared profiler: `with profiling.stage("holistic.process"):`."""
+    return get_profiler().stage(name)
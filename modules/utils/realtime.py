@@ -0,0 +1,134 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from . import crop_utils
+
+
+class DropOldestQueue():
+    """Bounded queue between two threads, a put on a full queue drops the oldest item.
+
+    A slow consumer then always gets the freshest items, and never adds latency by working through a backlog.
+    """
+
+    def __init__(self, maxsize: int = 2):
+        self.items = deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.n_dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.n_dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout: float = None):
+        """Oldest item, or None after `timeout` seconds."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.items) > 0, timeout=timeout):
+                return None
+            return self.items.popleft()
+
+    def get_nowait(self):
+        with self.cond:
+            return self.items.popleft() if len(self.items) > 0 else None
+
+
+class StageCounter():
+    """Rolling FPS and latency of one pipeline stage, over the last `window` items."""
+
+    def __init__(self, window: int = 60):
+        self.times = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+    def tick(self, latency: float):
+        self.times.append(time.perf_counter())
+        self.latencies.append(latency)
+
+    @property
+    def fps(self) -> float:
+        if len(self.times) < 2:
+            return 0.
+        return (len(self.times) - 1) / max(self.times[-1] - self.times[0], 1e-9)
+
+    @property
+    def latency_ms(self) -> float:
+        return float(np.mean(self.latencies)) * 1000 if len(self.latencies) > 0 else 0.
+
+
+class CaptureThread(threading.Thread):
+    """Read camera frames as square RGB images into `out_queue`, as {"frame_rgb", "t_capture"} items."""
+
+    def __init__(self, cap: cv2.VideoCapture, out_queue: DropOldestQueue):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.out_queue = out_queue
+        self.counter = StageCounter()
+        self.running = True
+        self.failed = False
+
+    def run(self):
+        while self.running:
+            t1 = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                logging.error("Camera frame not available.")
+                self.failed = True
+                break
+
+            frame = crop_utils.crop_square(frame)
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.counter.tick(time.perf_counter() - t1)
+            self.out_queue.put({"frame_rgb": frame_rgb, "t_capture": t1})
+
+    def stop(self):
+        self.running = False
+
+
+class WorkerThread(threading.Thread):
+    """Run `process_fn(frame_rgb)` on the items of `in_queue`, its output is added to the item as "result"."""
+
+    def __init__(self, process_fn, in_queue: DropOldestQueue, out_queue: DropOldestQueue):
+        super().__init__(daemon=True)
+        self.process_fn = process_fn
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.counter = StageCounter()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            item = self.in_queue.get(timeout=0.1)
+            if item is None:
+                continue
+
+            t1 = time.perf_counter()
+            try:
+                item["result"] = self.process_fn(item["frame_rgb"])
+            except Exception:
+                logging.exception("Frame processing failed, skipped.")
+                continue
+            self.counter.tick(time.perf_counter() - t1)
+            self.out_queue.put(item)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,82 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gin
+import numpy as np
+
+from . import skeleton_utils
+
+# HolisticManager result key of each video part.
+FRAME_KEYS = {"pose_frames": "pose_4d", "face_frames": "face_3d", "lh_frames": "lh_3d", "rh_frames": "rh_3d"}
+
+
+@gin.configurable
+class SkeletonRingBuffer():
+    """Last `capacity` holistic results, kept in preallocated [capacity, J, C] arrays.
+
+    Frames are addressed by their absolute index, the number of frames appended before them since the last clear.
+    With `filtered`, filter_visibility is applied to each frame once when appended, and pose has no visibility channel.
+    """
+
+    def __init__(self, capacity: int = 150, filtered: bool = False):
+        self.capacity = capacity
+        self.filtered = filtered
+        # Allocated on the first frame, with its shapes.
+        self.buffers = None
+        self.clear()
+
+    def clear(self):
+        self.total = 0
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    @property
+    def first(self) -> int:
+        """Absolute index of the oldest frame still in the buffer."""
+        return self.total - len(self)
+
+    def append(self, frame_res: dict):
+        frame = {part: frame_res[key][np.newaxis] for part, key in FRAME_KEYS.items()}
+        if self.filtered:
+            frame = skeleton_utils.filter_visibility(frame)
+
+        if self.buffers is None:
+            self.buffers = {
+                part: np.zeros((self.capacity,) + frame[part].shape[1:], dtype=np.float32) for part in FRAME_KEYS.keys()
+            }
+
+        i = self.total % self.capacity
+        for part in FRAME_KEYS.keys():
+            self.buffers[part][i] = frame[part][0]
+        self.total += 1
+
+    def get_range(self, start: int, end: int) -> dict:
+        """Frames [start, end) as a new vid_res dict, in chronological order."""
+        assert self.first <= start < end <= self.total, \
+            f"[ERROR] Frames [{start}, {end}) not in buffer [{self.first}, {self.total})."
+
+        return self.get_frames(np.arange(start, end))
+
+    def get_frames(self, indices: list[int]) -> dict:
+        """Frames at the given absolute indices as a new vid_res dict."""
+        indices = np.asarray(indices)
+        assert np.all((indices >= self.first) & (indices < self.total)), "[ERROR] Frames not in buffer."
+
+        vid_res = {part: buffer[indices % self.capacity] for part, buffer in self.buffers.items()}
+        vid_res["n_frames"] = len(indices)
+        return vid_res
+
+    def latest(self, n: int) -> dict:
+        return self.get_range(self.total - n, self.total)
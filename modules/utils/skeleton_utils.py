@@ -15,13 +15,15 @@
 import gin
 import numpy as np
 import numpy.typing as npt
-import tensorflow as tf
-from scipy.stats import beta
 
 
 @gin.configurable
 def filter_visibility(vid_res: dict, bp_hand_thres: float, lh_inpose: list[int], rh_inpose: list[int],
                       ignore_value) -> list[npt.ArrayLike]:
+    """Mask low confidence joints, returns a new dict and leaves the input arrays untouched.
+
+    Every step is per frame, so it can run after resampling on the picked frames only.
+    """
 
     # the value that was set from holistic module.
     MISSING_VALUE = 0.
@@ -30,10 +32,15 @@ def filter_visibility(vid_res: dict, bp_hand_thres: float, lh_inpose: list[int],
 
     assert vid_res["pose_frames"].shape[2] == 4, "[ERROR] Missing visibility channel."
 
+    # Work on copies, without the visibility channel.
+    pose_frames = vid_res["pose_frames"][:, :, :3].copy()
+    lh_frames = vid_res["lh_frames"].copy()
+    rh_frames = vid_res["rh_frames"].copy()
+
     # _____ 1. _____
     # Remove hand in pose4d if blazepose_visibility < threshold.
-    lh_view = vid_res["pose_frames"][:, lh_inpose]
-    rh_view = vid_res["pose_frames"][:, rh_inpose]
+    lh_view = pose_frames[:, lh_inpose]
+    rh_view = pose_frames[:, rh_inpose]
 
     missing_pl = np.all(vid_res["pose_frames"][:, lh_inpose][:, :, 3] < bp_hand_thres, axis=1)
     missing_pr = np.all(vid_res["pose_frames"][:, rh_inpose][:, :, 3] < bp_hand_thres, axis=1)
@@ -43,38 +50,42 @@ def filter_visibility(vid_res: dict, bp_hand_thres: float, lh_inpose: list[int],
 
     # _____ 2. _____
     # Remove hand in pose3d if no hand-landmarks detected.
-    lh_view[vid_res["lh_frames"][:, 0, 0] == MISSING_VALUE] = ignore_value
-    rh_view[vid_res["rh_frames"][:, 0, 0] == MISSING_VALUE] = ignore_value
+    lh_view[lh_frames[:, 0, 0] == MISSING_VALUE] = ignore_value
+    rh_view[rh_frames[:, 0, 0] == MISSING_VALUE] = ignore_value
 
     # Assign.
-    vid_res["pose_frames"][:, lh_inpose] = lh_view
-    vid_res["pose_frames"][:, rh_inpose] = rh_view
+    pose_frames[:, lh_inpose] = lh_view
+    pose_frames[:, rh_inpose] = rh_view
 
     # _____ 3. _____
     # Replace 0. to -5.
-    vid_res["lh_frames"][vid_res["lh_frames"] == MISSING_VALUE] = ignore_value
-    vid_res["rh_frames"][vid_res["rh_frames"] == MISSING_VALUE] = ignore_value
+    lh_frames[lh_frames == MISSING_VALUE] = ignore_value
+    rh_frames[rh_frames == MISSING_VALUE] = ignore_value
 
     # Remove hand-landmarks if no hand in pose4d.
-    vid_res["lh_frames"][missing_pl] = ignore_value
-    vid_res["rh_frames"][missing_pr] = ignore_value
+    lh_frames[missing_pl] = ignore_value
+    rh_frames[missing_pr] = ignore_value
 
-    # Remove visibility channel.
-    vid_res["pose_frames"] = vid_res["pose_frames"][:, :, :3]
+    out_res = dict(vid_res)
+    out_res["pose_frames"] = pose_frames
+    out_res["lh_frames"] = lh_frames
+    out_res["rh_frames"] = rh_frames
 
-    return vid_res
+    return out_res
 
 
 ## ─── SKELETON SAMPLING ───────────────────────────────────────────────────────────
 
 
 def apply_resampling(vid_res: dict, indices: list[int]):
-    vid_res["pose_frames"] = vid_res["pose_frames"][indices]
-    vid_res["face_frames"] = vid_res["face_frames"][indices]
-    vid_res["lh_frames"] = vid_res["lh_frames"][indices]
-    vid_res["rh_frames"] = vid_res["rh_frames"][indices]
-    vid_res["n_frames"] = len(indices)
-    return vid_res
+    """Pick frames into a new dict, the fancy indexing allocates fresh [len(indices), J, C] arrays."""
+    out_res = dict(vid_res)
+    out_res["pose_frames"] = vid_res["pose_frames"][indices]
+    out_res["face_frames"] = vid_res["face_frames"][indices]
+    out_res["lh_frames"] = vid_res["lh_frames"][indices]
+    out_res["rh_frames"] = vid_res["rh_frames"][indices]
+    out_res["n_frames"] = len(indices)
+    return out_res
 
 
 def uniform_sampling(n_frames: int, n_pick: int):
@@ -98,13 +109,22 @@ def random_sampling(n_frames: int, n_pick: int):
     return indices
 
 
-beta_distribution = beta(a=2.5, b=3)
+beta_distribution = None
+
+
+def get_beta_distribution():
+    # scipy.stats takes a second to import, only the training sampling needs it.
+    global beta_distribution
+    if beta_distribution is None:
+        from scipy.stats import beta
+        beta_distribution = beta(a=2.5, b=3)
+    return beta_distribution
 
 
 def beta_sampling(n_frames: int, n_pick: int):
     total_range = np.arange(n_frames)
     range_norm = total_range / n_frames
-    beta_p = beta_distribution.pdf(range_norm) + 1e-5
+    beta_p = get_beta_distribution().pdf(range_norm) + 1e-5
     beta_p = beta_p / beta_p.sum()
 
     replace = False if n_frames >= n_pick else True
@@ -146,6 +166,9 @@ def clipped_beta_sampling(n_frames: int, n_pick: int):
 
 
 def normalize_keypoints(keypoints, center_location, a_idx, b_idx, ignore_value, add_visibility):
+    # Only the model graph needs TensorFlow, importing modules.utils doesn't load it.
+    import tensorflow as tf
+
     # Mask valid.
     mask = tf.not_equal(keypoints, ignore_value)
     # Re-center
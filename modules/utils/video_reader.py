@@ -0,0 +1,136 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+class VideoReader():
+    """Read a video file as letterboxed square RGB frames, at most `target_fps` frames per second.
+
+    Frames above the target rate are only grabbed, they are never converted to an image. Kept frames are
+    resized in one step and written into a preallocated canvas, which is reused: a frame returned by
+    `read` is overwritten by the next one, copy it to keep it. Its gray border is refilled on every read,
+    drawing on a returned frame doesn't leak into the next one.
+
+    Args:
+        video_path (Path): Video file.
+        size (int): Side of the square output frames.
+        target_fps (float): Maximum frame rate of the output, None keeps every frame.
+        interpolation (int): cv2 interpolation of the resize.
+    """
+
+    def __init__(self,
+                 video_path: Path,
+                 size: int = 480,
+                 target_fps: float = None,
+                 interpolation: int = cv2.INTER_LINEAR):
+        self.cap = cv2.VideoCapture(Path(video_path).as_posix())
+        self.size = size
+        self.interpolation = interpolation
+
+        self.src_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if target_fps is None or target_fps <= 0 or self.src_fps <= 0:
+            self.step = 1.
+        else:
+            self.step = max(self.src_fps / target_fps, 1.)
+
+        # Counters, for the throughput of the video.
+        self.n_grabbed = 0
+        self.n_decoded = 0
+        self.seconds = 0.
+        self.next_index = 0.
+
+        self.frame_shape = None
+        self.canvas = np.full((size, size, 3), 128, np.uint8)
+
+    @property
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    @property
+    def fps(self) -> float:
+        """Frame rate of the output frames."""
+        return self.src_fps / self.step
+
+    def alloc(self, frame_shape: tuple):
+        ih, iw = frame_shape
+        scale = min(self.size / iw, self.size / ih)
+        self.nw, self.nh = int(iw * scale), int(ih * scale)
+        self.dx, self.dy = (self.size - self.nw) // 2, (self.size - self.nh) // 2
+        self.resized = np.empty((self.nh, self.nw, 3), np.uint8)
+        # Border strips around the picture, top and bottom or left and right.
+        if self.dy > 0:
+            self.borders = [self.canvas[:self.dy], self.canvas[self.dy + self.nh:]]
+        else:
+            self.borders = [self.canvas[:, :self.dx], self.canvas[:, self.dx + self.nw:]]
+        self.frame_shape = frame_shape
+
+    def letterbox(self, frame):
+        if frame.shape[:2] != self.frame_shape:
+            self.alloc(frame.shape[:2])
+
+        # Resize then convert the smaller image, the border of the canvas is gray in BGR and RGB.
+        cv2.resize(frame, (self.nw, self.nh), dst=self.resized, interpolation=self.interpolation)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.resized)
+        # The caller may have drawn on the previous frame, borders included.
+        for border in self.borders:
+            border.fill(128)
+        self.canvas[self.dy:self.dy + self.nh, self.dx:self.dx + self.nw] = self.resized
+        return self.canvas
+
+    def read(self):
+        """Next kept frame, or None at the end of the video."""
+        t1 = time.perf_counter()
+        frame_rgb = None
+        while self.cap.grab():
+            index = self.n_grabbed
+            self.n_grabbed += 1
+            if index < self.next_index:
+                continue
+
+            self.next_index += self.step
+            ret, frame = self.cap.retrieve()
+            if not ret or frame is None:
+                continue
+
+            self.n_decoded += 1
+            frame_rgb = self.letterbox(frame)
+            break
+
+        self.seconds += time.perf_counter() - t1
+        return frame_rgb
+
+    def __iter__(self):
+        while True:
+            frame_rgb = self.read()
+            if frame_rgb is None:
+                return
+            yield frame_rgb
+
+    def stats(self) -> dict:
+        """Frames grabbed and decoded, and the seconds spent reading them."""
+        return {"grabbed": self.n_grabbed, "decoded": self.n_decoded, "read_seconds": self.seconds}
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
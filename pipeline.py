@@ -12,48 +12,118 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
+import threading
+import time
+
 import cv2
 import gin
 import numpy as np
 
-from modules import holistic, translator
-
-gin.parse_config_file('configs/holistic.gin')
-gin.parse_config_file('configs/translator_inference.gin')
-gin.parse_config_file('configs/utils.gin')
+from modules import utils
 
 
 class Pipeline:
+    """Holistic and translator around the demo GUI.
+
+    The models are built by `load_models`, which imports MediaPipe and TensorFlow and takes seconds: the GUI can
+    run it in a background thread and show the camera meanwhile. Until it returns, `update` does nothing.
+    """
 
     def __init__(self):
         super().__init__()
         self.is_recording = True
         self.knn_records = []
-        self.holistic_manager = holistic.HolisticManager()
-        self.translator_manager = translator.TranslatorManager()
+        # Guards the history lists when update runs in another thread than the GUI callbacks.
+        self.history_lock = threading.RLock()
+
+        # Continuous mode: the last frames are kept in a ring buffer and cut into signs automatically.
+        self.is_continuous = False
+
+        self.is_loaded = False
+        # Seconds from `t_start` to the first occurrence of each startup event.
+        self.t_start = time.perf_counter()
+        self.startup_times = {}
 
         self.reset_pipeline()
 
+    def mark_startup(self, event: str):
+        if event not in self.startup_times:
+            self.startup_times[event] = time.perf_counter() - self.t_start
+            logging.info(f"Startup: {event} after {self.startup_times[event]:.2f} s.")
+
+    def load_models(self):
+        """Build holistic and the translator, and run both once on dummy inputs."""
+        # Imported here, they load MediaPipe and TensorFlow. The configs need the configurables registered first.
+        from modules import holistic, translator
+        gin.parse_config_file('configs/holistic.gin')
+        gin.parse_config_file('configs/translator_inference.gin')
+        gin.parse_config_file('configs/utils.gin')
+
+        self.holistic_manager = holistic.HolisticManager(presence_gate=True)
+        self.translator_manager = translator.TranslatorManager()
+
+        self.ring_buffer = utils.ring_buffer.SkeletonRingBuffer()
+        self.segmenter = translator.SignSegmenter()
+        assert self.segmenter.max_frames + self.segmenter.pre_frames <= self.ring_buffer.capacity, \
+            "[ERROR] SkeletonRingBuffer.capacity is too small for the longest sign."
+
+        self.holistic_manager.warmup()
+        self.translator_manager.warmup()
+
+        with self.history_lock:
+            self.is_loaded = True
+            self.reset_pipeline()
+        self.mark_startup("models_loaded")
+
     def reset_pipeline(self):
-        self.pose_history = []
-        self.face_history = []
-        self.lh_history = []
-        self.rh_history = []
+        with self.history_lock:
+            self.pose_history = []
+            self.face_history = []
+            self.lh_history = []
+            self.rh_history = []
+            if self.is_loaded:
+                self.ring_buffer.clear()
+                self.segmenter.reset()
+
+    def update_continuous(self, frame_rgb, frame_res: dict):
+        """Returns the vid_res of a sign that just ended, otherwise None."""
+        # Every frame, absent person included, so the segmenter sees the sign end.
+        with self.history_lock:
+            self.ring_buffer.append(frame_res)
+            segment = self.segmenter.update(frame_res)
+
+        if self.segmenter.is_active:
+            cv2.putText(frame_rgb, "Signing...", (10, 300), cv2.FONT_HERSHEY_DUPLEX, 2, (255, 0, 0), 1)
+
+        if segment is None:
+            return None
+
+        start, end = segment
+        return self.ring_buffer.get_range(max(start, self.ring_buffer.first), end)
 
     def update(self, frame_rgb):
-        h, w, _ = frame_rgb.shape
-        assert h == w
+        if not self.is_loaded:
+            return None
+
+        with utils.profiling.stage("pipeline.update"):
+            h, w, _ = frame_rgb.shape
+            assert h == w
+
+            frame_res = self.holistic_manager(frame_rgb)
 
-        frame_res = self.holistic_manager(frame_rgb)
+            if self.is_continuous:
+                return self.update_continuous(frame_rgb, frame_res)
 
-        # Return if not found person.
-        if np.all(frame_res["pose_4d"] == 0.):
-            return
+            # Return if not found person.
+            if np.all(frame_res["pose_4d"] == 0.):
+                return
 
-        if self.is_recording:
-            cv2.putText(frame_rgb, "Recording...", (10, 300), cv2.FONT_HERSHEY_DUPLEX, 2, (255, 0, 0), 1)
+            if self.is_recording:
+                cv2.putText(frame_rgb, "Recording...", (10, 300), cv2.FONT_HERSHEY_DUPLEX, 2, (255, 0, 0), 1)
 
-            self.pose_history.append(frame_res["pose_4d"])
-            self.face_history.append(frame_res["face_3d"])
-            self.lh_history.append(frame_res["lh_3d"])
-            self.rh_history.append(frame_res["rh_3d"])
+                with self.history_lock:
+                    self.pose_history.append(frame_res["pose_4d"])
+                    self.face_history.append(frame_res["face_3d"])
+                    self.lh_history.append(frame_res["lh_3d"])
+                    self.rh_history.append(frame_res["rh_3d"])
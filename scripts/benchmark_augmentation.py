@@ -0,0 +1,79 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+
+import gin
+import numpy as np
+
+from modules.translator import augmentation
+
+gin.parse_config_file('configs/translator.gin')
+gin.parse_config_file('configs/utils.gin')
+
+IGNORE_VALUE = gin.query_parameter('%IGNORE_VALUE')
+
+PARTS = {"pose_frames": 15, "face_frames": 25, "lh_frames": 21, "rh_frames": 21}
+
+
+def random_batch(batch_size: int, n_frames: int) -> dict:
+    batch = {k: np.random.random([batch_size, n_frames, n_joints, 3]).astype(np.float32) for k, n_joints in PARTS.items()}
+    # Missing hands, as after filter_visibility.
+    batch["lh_frames"][::4] = IGNORE_VALUE
+    batch["rh_frames"][:, ::3] = IGNORE_VALUE
+    return batch
+
+
+def augment_loop(batch: dict) -> dict:
+    out = [augmentation.augment_video({k: v[i] for k, v in batch.items()}) for i in range(len(batch["pose_frames"]))]
+    return {k: np.stack([vid[k] for vid in out]) for k in batch.keys()}
+
+
+def check_rotations():
+    degs = np.random.randint(-10, 11, size=[100, 3])
+    rot = augmentation.get_rxyz_batch(degs)
+    for (x, y, z), r in zip(degs, rot):
+        assert np.allclose(augmentation.get_rx(x) @ augmentation.get_ry(y) @ augmentation.get_rz(z), r)
+
+
+def main(batch_size: int, n_frames: int, n_iter: int):
+    check_rotations()
+
+    batch = random_batch(batch_size, n_frames)
+
+    # Same distribution: compare the displacement statistics of both versions.
+    loop_out, batch_out = augment_loop(batch), augmentation.augment_batch(batch)
+    for k in batch.keys():
+        loop_diff = np.abs(loop_out[k] - batch[k])
+        batch_diff = np.abs(batch_out[k] - batch[k])
+        assert np.array_equal(loop_out[k] == IGNORE_VALUE, batch_out[k] == IGNORE_VALUE)
+        print(f"{k:12s} mean displacement loop {loop_diff.mean():.4f} batch {batch_diff.mean():.4f}, "
+              f"std loop {loop_diff.std():.4f} batch {batch_diff.std():.4f}")
+
+    for name, fn in [("per sample", augment_loop), ("batched", augmentation.augment_batch)]:
+        t1 = time.perf_counter()
+        for _ in range(n_iter):
+            fn(batch)
+        print(f"{name:10s} {(time.perf_counter() - t1) / n_iter * 1000:8.2f} ms/batch of {batch_size}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', default=256, type=int)
+    parser.add_argument('--n_frames', default=60, type=int)
+    parser.add_argument('--n_iter', default=10, type=int)
+    args = parser.parse_args()
+
+    main(args.batch_size, args.n_frames, args.n_iter)
@@ -0,0 +1,83 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+
+import gin
+import numpy as np
+import tensorflow as tf
+
+from modules.translator import model
+
+gin.parse_config_file('configs/translator_inference.gin')
+
+IGNORE_VALUE = -100.
+
+
+def get_triu_indicies(batch_size: int, n_joints: int, n_frames: int):
+    """Previous [B*F*M, 4] gather_nd indices, kept for comparison only."""
+    triu_idxs = np.array(np.triu_indices(n_joints))
+    num_member = len(triu_idxs[0])
+    triu_idxs = np.tile(triu_idxs, batch_size * n_frames).transpose()
+    grid = np.mgrid[0:batch_size, 0:n_frames, 0:num_member].reshape(3, -1).transpose()
+    return np.concatenate([grid, triu_idxs], axis=1)[:, [0, 1, 3, 4]]
+
+
+def cdist_gather_nd(input, gather_idxs):
+    batch_size = tf.shape(input)[0]
+    n_frames = tf.shape(input)[1]
+    mask = tf.math.reduce_all(tf.not_equal(input, IGNORE_VALUE), axis=-1)
+    mask_float = tf.where(mask, 1., 0.)
+    mask_mat = tf.math.equal(tf.expand_dims(mask_float, 2) * tf.expand_dims(mask_float, 3), 1.)
+    dist_mat = tf.where(mask_mat, model.batch_cdist(input, input), IGNORE_VALUE)
+    dist_mat = tf.gather_nd(dist_mat, gather_idxs, batch_dims=0)
+    return tf.reshape(dist_mat, shape=[batch_size, n_frames, -1])
+
+
+def time_fn(fn, x, n_iter: int) -> float:
+    fn(x)
+    t1 = time.perf_counter()
+    for _ in range(n_iter):
+        fn(x).numpy()
+    return (time.perf_counter() - t1) / n_iter * 1000
+
+
+def main(batch_sizes: list[int], n_frames: int, n_joints: int, n_iter: int):
+    flat_idxs = model.get_triu_flat_indices(n_joints)
+    new_fn = tf.function(lambda x: model.cdist(x, flat_idxs, ignore_value=IGNORE_VALUE))
+
+    for batch_size in batch_sizes:
+        x = np.random.random([batch_size, n_frames, n_joints, 3]).astype(np.float32)
+        x[:, :, 0] = IGNORE_VALUE
+
+        nd_idxs = get_triu_indicies(batch_size, n_joints, n_frames)
+        old_fn = tf.function(lambda x: cdist_gather_nd(x, nd_idxs))
+
+        max_diff = np.abs(old_fn(x).numpy() - new_fn(x).numpy()).max()
+        old_ms = time_fn(old_fn, x, n_iter)
+        new_ms = time_fn(new_fn, x, n_iter)
+        print(f"batch {batch_size:4d}  gather_nd {old_ms:8.3f} ms (index {nd_idxs.nbytes / 1e6:6.2f} MB)  "
+              f"flat gather {new_ms:8.3f} ms (index {flat_idxs.nbytes / 1e3:5.2f} KB)  max diff {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', default=[1, 64, 256], type=int, nargs="+")
+    parser.add_argument('--n_frames', default=16, type=int)
+    parser.add_argument('--n_joints', default=25, type=int)
+    parser.add_argument('--n_iter', default=20, type=int)
+    args = parser.parse_args()
+
+    main(args.batch_sizes, args.n_frames, args.n_joints, args.n_iter)
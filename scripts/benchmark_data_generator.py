@@ -0,0 +1,68 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+import gin
+import numpy as np
+
+from modules import translator
+
+gin.parse_config_file('configs/translator_train.gin')
+gin.parse_config_file('configs/utils.gin')
+
+
+def main(skeleton_dir: Path, batch_size: int, n_batches: int, lazy: bool):
+    # Labels from the h5 files, same as the training notebook.
+    labels = {p.stem: [i, p.stem] for i, p in enumerate(sorted(skeleton_dir.glob("*.h5")))}
+    train_generator = translator.DataGenerator(skeleton_dir.as_posix(),
+                                               batch_size=batch_size,
+                                               labels=labels,
+                                               lazy=lazy)
+    hards = list(range(min(50, len(labels))))
+
+    # Warm up.
+    train_generator.__getitem__(0, hards)
+
+    # Time per batch, without tracing overhead.
+    t1 = time.perf_counter()
+    for _ in range(n_batches):
+        train_generator.__getitem__(0, hards)
+    elapsed = (time.perf_counter() - t1) / n_batches
+
+    # Peak memory allocated while building one batch.
+    peaks = []
+    tracemalloc.start()
+    for _ in range(n_batches):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        train_generator.__getitem__(0, hards)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    print(f"batch {batch_size}: {elapsed * 1000:.1f} ms/batch, peak allocation {np.mean(peaks) / 1e6:.2f} MB/batch")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('skeleton_dir')
+    parser.add_argument('--batch_size', default=256, type=int)
+    parser.add_argument('--n_batches', default=10, type=int)
+    parser.add_argument('--lazy', action='store_true')
+    args = parser.parse_args()
+
+    main(Path(args.skeleton_dir), args.batch_size, args.n_batches, args.lazy)
@@ -0,0 +1,127 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from modules.translator import knn_database, knn_index
+
+logging.basicConfig(level=logging.INFO)
+
+
+def synthetic_database(n_records: int, dim: int, records_per_gloss: int = 50, noise: float = 0.3):
+    """Clustered random features, one cluster per gloss."""
+    rng = np.random.default_rng(0)
+    n_glosses = max(1, n_records // records_per_gloss)
+    centers = rng.standard_normal([n_glosses, dim]).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    label_ids = rng.integers(0, n_glosses, size=n_records).astype(np.int32)
+    # In float32 chunks, a float64 noise matrix of 1M records doesn't fit in memory.
+    feats = centers[label_ids]
+    for start in range(0, n_records, 65536):
+        noise_chunk = rng.standard_normal([len(feats[start:start + 65536]), dim], dtype=np.float32)
+        feats[start:start + 65536] += noise / np.sqrt(dim) * noise_chunk
+    return feats, label_ids
+
+
+def vote(label_ids, indices):
+    # IVF pads short results with -1.
+    indices = indices[indices >= 0]
+    vals, counts = np.unique(label_ids[indices], return_counts=True)
+    return vals[np.argmax(counts)]
+
+
+def benchmark(index, exact_index, queries, label_ids, k: int):
+    # Exact neighbours in one batch, a single brute force query of 1M records takes seconds.
+    _, exact_indices = exact_index.search_batch(queries, k)
+    latencies = []
+    agree = 0
+    for q, exact_row in zip(queries, exact_indices):
+        t1 = time.perf_counter()
+        _, indices = index.search(q, k)
+        latencies.append(time.perf_counter() - t1)
+
+        agree += vote(label_ids, indices) == vote(label_ids, exact_row)
+
+    latencies = np.array(latencies) * 1000
+    recall = knn_index.recall_at_k(index, exact_index, queries, k)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), recall, agree / len(queries)
+
+
+def main(args):
+    if args.synthetic > 0:
+        feats, label_ids = synthetic_database(args.synthetic, args.dim)
+    else:
+        feats, label_ids, _ = knn_database.KnnDatabase(args.knn_dir).load()
+    logging.info(f"Database: {feats.shape}")
+
+    rng = np.random.default_rng(1)
+    query_ids = rng.choice(len(feats), size=min(args.n_queries, len(feats)), replace=False)
+    queries = np.asarray(feats[query_ids]) + 0.01 * rng.standard_normal([len(query_ids), feats.shape[1]])
+    queries = queries.astype(np.float32)
+
+    exact_index = knn_index.BruteForceIndex().build(feats)
+    indices = {
+        "brute_force": exact_index,
+        "ivf": knn_index.IVFIndex(n_lists=args.n_lists, n_probe=args.n_probe),
+    }
+
+    for name, index in indices.items():
+        t1 = time.perf_counter()
+        if index is not exact_index:
+            index.build(feats, index_dir=args.index_dir, version=[len(feats), 0])
+        build_time = time.perf_counter() - t1
+
+        p50, p95, recall, agree = benchmark(index, exact_index, queries, label_ids, args.k)
+        print(f"{name:12s} build {build_time:8.2f} s  query p50 {p50:8.3f} ms  p95 {p95:8.3f} ms  "
+              f"recall@{args.k} {recall:.4f}  vote agreement {agree:.4f}")
+
+        # All queries in one call.
+        t1 = time.perf_counter()
+        index.search_batch(queries, args.k)
+        batch_time = (time.perf_counter() - t1) * 1000
+        print(f"{name:12s} batch of {len(queries)} queries {batch_time:8.2f} ms "
+              f"({batch_time / len(queries):.3f} ms/query)")
+
+        if args.index_dir is not None and index is not exact_index:
+            # What TranslatorManager.load_knn_database pays instead of the build when the store is unchanged.
+            t1 = time.perf_counter()
+            loaded = knn_index.IVFIndex(n_lists=args.n_lists, n_probe=args.n_probe)
+            assert loaded.load(args.index_dir, [len(feats), 0]), "[ERROR] Saved IVF index not found."
+            print(f"{name:12s} load  {time.perf_counter() - t1:8.2f} s from {args.index_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--knn_dir', default="data/knn")
+    parser.add_argument('--synthetic',
+                        default=0,
+                        type=int,
+                        help="Benchmark on this many synthetic records instead of the KNN database.")
+    parser.add_argument('--dim', default=336, type=int)
+    parser.add_argument('--n_queries', default=200, type=int)
+    parser.add_argument('--k', default=5, type=int)
+    parser.add_argument('--n_lists', default=None, type=int)
+    parser.add_argument('--n_probe', default=8, type=int)
+    parser.add_argument('--index_dir',
+                        default=None,
+                        type=Path,
+                        help="Save the IVF index there and search the loaded one, as TranslatorManager does.")
+    args = parser.parse_args()
+
+    main(args)
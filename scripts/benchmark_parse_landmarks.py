@@ -0,0 +1,85 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+
+import gin
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from modules.holistic import utils
+
+gin.parse_config_file('configs/holistic.gin')
+
+SELECTED_POSE = gin.query_parameter('%SELECTED_POSE')
+SELECTED_FACE = gin.query_parameter('%SELECTED_FACE')
+
+
+def random_landmarks(n: int) -> landmark_pb2.NormalizedLandmarkList:
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, v in np.random.random([n, 4]):
+        landmark_list.landmark.add(x=x, y=y, z=z, visibility=v)
+    return landmark_list
+
+
+def parse_frame_loop(pose, face, lh, rh):
+    """Previous per-landmark loop over every joint, then filtering."""
+
+    def parse(obj, get_visibility=False):
+        result = np.zeros([len(obj), 4]) if get_visibility else np.zeros([len(obj), 3])
+        for i in range(len(obj)):
+            if get_visibility:
+                result[i] = obj[i].x, obj[i].y, obj[i].z, obj[i].visibility
+            else:
+                result[i] = obj[i].x, obj[i].y, obj[i].z
+        return result
+
+    pose_4d = utils.filter_pose(parse(pose, get_visibility=True))
+    face_3d = utils.filter_face(parse(face))
+    return pose_4d, face_3d, parse(lh), parse(rh)
+
+
+def parse_frame_selected(pose, face, lh, rh):
+    pose_4d = np.zeros([15, 4], dtype=np.float32)
+    face_3d = np.zeros([25, 3], dtype=np.float32)
+    lh_3d = np.zeros([21, 3], dtype=np.float32)
+    rh_3d = np.zeros([21, 3], dtype=np.float32)
+    utils.parse_selected_landmarks(pose, SELECTED_POSE, get_visibility=True, out=pose_4d)
+    utils.parse_selected_landmarks(face, SELECTED_FACE, out=face_3d)
+    utils.parse_selected_landmarks(lh, out=lh_3d)
+    utils.parse_selected_landmarks(rh, out=rh_3d)
+    return pose_4d, face_3d, lh_3d, rh_3d
+
+
+def main(n_iter: int):
+    frame = [random_landmarks(33).landmark, random_landmarks(468).landmark]
+    frame += [random_landmarks(21).landmark, random_landmarks(21).landmark]
+
+    for old, new in zip(parse_frame_loop(*frame), parse_frame_selected(*frame)):
+        assert np.allclose(old, new, atol=1e-6)
+
+    for name, fn in [("loop + filter", parse_frame_loop), ("selected", parse_frame_selected)]:
+        t1 = time.perf_counter()
+        for _ in range(n_iter):
+            fn(*frame)
+        print(f"{name:14s} {(time.perf_counter() - t1) / n_iter * 1e6:8.1f} us/frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_iter', default=1000, type=int)
+    args = parser.parse_args()
+
+    main(args.n_iter)
@@ -0,0 +1,92 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+
+import gin
+import numpy as np
+
+from modules import translator
+
+gin.parse_config_file('configs/translator_inference.gin')
+gin.parse_config_file('configs/utils.gin')
+
+
+def random_frame() -> dict:
+    lh_3d = np.random.random([21, 3]).astype(np.float32)
+    # Hand detected in pose and in most frames.
+    if np.random.random() < 0.2:
+        lh_3d[:] = 0.
+    return {
+        "pose_4d": np.random.random([15, 4]).astype(np.float32) * 0.3 + 0.7,
+        "face_3d": np.random.random([25, 3]).astype(np.float32),
+        "lh_3d": lh_3d,
+        "rh_3d": np.random.random([21, 3]).astype(np.float32),
+    }
+
+
+def main(n_stream: int):
+    translator_manager = translator.TranslatorManager()
+    assert translator_manager.load_knn_database(), "[ERROR] Empty KNN database."
+    streaming = translator.StreamingTranslator(translator_manager)
+    window, stride = streaming.window, streaming.stride
+
+    # Previous approach: unbounded per-frame lists, stacked and preprocessed on every prediction.
+    history = {"pose_frames": [], "face_frames": [], "lh_frames": [], "rh_frames": []}
+    list_latencies = []
+
+    for i in range(n_stream):
+        frame_res = random_frame()
+        for part, key in zip(history.keys(), ["pose_4d", "face_3d", "lh_3d", "rh_3d"]):
+            history[part].append(frame_res[key])
+
+        res_stream = streaming.update(frame_res)
+
+        if (i + 1) % stride != 0 or i + 1 < translator_manager.n_frames:
+            continue
+
+        t1 = time.perf_counter()
+        vid_res = {part: np.stack(frames[-window:]) for part, frames in history.items()}
+        vid_res["n_frames"] = len(vid_res["pose_frames"])
+        res_list = translator_manager.run_knn(translator_manager.get_feats(vid_res))
+        list_latencies.append(time.perf_counter() - t1)
+
+        assert res_list == res_stream, f"Frame {i}: {res_list} != {res_stream}"
+
+        # Drop the first prediction, it traces the model.
+        if len(list_latencies) == 1:
+            streaming.latencies.clear()
+
+    list_latencies = np.array(list_latencies[1:]) * 1000
+    print(f"lists + stack  p50 {np.percentile(list_latencies, 50):6.2f} ms  "
+          f"p95 {np.percentile(list_latencies, 95):6.2f} ms  memory grows with the stream")
+    report = streaming.latency_report()
+    print(f"ring buffer    p50 {report['p50_ms']:6.2f} ms  p95 {report['p95_ms']:6.2f} ms  "
+          f"p99 {report['p99_ms']:6.2f} ms  max {report['max_ms']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_stream', default=2000, type=int, help="Number of frames in the stream.")
+    parser.add_argument('--model_path', default=None)
+    parser.add_argument('--knn_dir', default=None)
+    args = parser.parse_args()
+
+    if args.model_path is not None:
+        gin.bind_parameter('TranslatorManager.model_path', args.model_path)
+    if args.knn_dir is not None:
+        gin.bind_parameter('TranslatorManager.knn_dir', args.knn_dir)
+
+    main(args.n_stream)
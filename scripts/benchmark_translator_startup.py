@@ -0,0 +1,100 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+# TensorFlow and the modules are only imported in the benchmark processes, each one measures a cold start.
+
+
+def random_inputs(batch_size: int, n_frames: int) -> list:
+    rng = np.random.default_rng(0)
+    return [rng.random([batch_size, n_frames, n, 3], dtype=np.float32) for n in [15, 25, 21, 21]]
+
+
+def cold_start(model_path: str, n_calls: int, batch_size: int) -> dict:
+    t0 = time.perf_counter()
+
+    import gin
+
+    from modules import translator, utils
+    gin.parse_config_file('configs/utils.gin')
+    gin.parse_config_file('configs/translator_inference.gin')
+    t_import = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    translator_manager = translator.TranslatorManager(model_path=model_path)
+    t_init = time.perf_counter() - t1
+
+    inputs = random_inputs(1, translator_manager.n_frames)
+    t1 = time.perf_counter()
+    translator_manager.encoder(inputs)
+    t_first = time.perf_counter() - t1
+
+    latencies = []
+    for _ in range(n_calls):
+        t1 = time.perf_counter()
+        translator_manager.encoder(inputs)
+        latencies.append(time.perf_counter() - t1)
+    latencies = np.array(latencies) * 1000
+
+    batch_inputs = random_inputs(batch_size, translator_manager.n_frames)
+    translator_manager.encoder(batch_inputs)
+    t1 = time.perf_counter()
+    for _ in range(5):
+        feats = translator_manager.encoder(batch_inputs)
+    batch_seconds = (time.perf_counter() - t1) / 5
+
+    return {
+        "import_s": t_import,
+        "init_s": t_init,
+        "first_call_s": t_first,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "batch_clips_per_s": batch_size / batch_seconds,
+        "feats": feats,
+    }
+
+
+def main(model_paths: list[str], n_calls: int, batch_size: int):
+    # A fresh interpreter per model, nothing is cached from a previous run.
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for model_path in model_paths:
+        with ctx.Pool(1) as pool:
+            results[model_path] = pool.apply(cold_start, (model_path, n_calls, batch_size))
+
+    ref_feats = results[model_paths[0]]["feats"]
+    print(f"{'model':48s} {'import':>8s} {'init':>8s} {'1st call':>9s} {'p50':>8s} {'p95':>8s} "
+          f"{'clips/s':>9s} {'max diff':>9s}")
+    for model_path, res in results.items():
+        max_diff = np.abs(res["feats"] - ref_feats).max()
+        print(f"{model_path[-48:]:48s} {res['import_s']:7.2f}s {res['init_s']:7.2f}s {res['first_call_s']:8.3f}s "
+              f"{res['p50_ms']:6.2f}ms {res['p95_ms']:6.2f}ms {res['batch_clips_per_s']:9.1f} {max_diff:9.2e}")
+    print(f"p50/p95: batch size 1, clips/s: batch size {batch_size}, max diff: features against {model_paths[0]}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model_paths',
+                        nargs="+",
+                        help="h5 weights, SavedModel dirs or .tflite files, the first one is the reference.")
+    parser.add_argument('--n_calls', default=200, type=int, help="Calls of batch size 1 for the latency.")
+    parser.add_argument('--batch_size', default=64, type=int)
+    args = parser.parse_args()
+
+    main(args.model_paths, args.n_calls, args.batch_size)
@@ -0,0 +1,55 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+from pathlib import Path
+
+from tqdm import tqdm
+
+from modules import utils
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main(input_dir: Path, output_dir: Path, to_format: int, compression: str):
+    all_h5 = [v for v in input_dir.glob("*.h5")]
+    logging.info(f"Globing {input_dir} Found {len(all_h5)} files.")
+    assert len(all_h5) > 0
+
+    for h5_path in tqdm(all_h5):
+        out_path = output_dir / h5_path.name
+        is_v2 = utils.file_utils.is_dataset_v2(h5_path)
+
+        if to_format == 2:
+            if is_v2:
+                logging.warning(f"{h5_path} is already v2, skipped.")
+                continue
+            utils.file_utils.convert_h5_v1_to_v2(h5_path, out_path, compression)
+        else:
+            if not is_v2:
+                logging.warning(f"{h5_path} is already v1, skipped.")
+                continue
+            utils.file_utils.convert_h5_v2_to_v1(h5_path, out_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--to', default=2, type=int, choices=[1, 2], help="Target layout.")
+    parser.add_argument('--compression', default=None, choices=["gzip", "lzf"], help="Compression of v2 files.")
+    args = parser.parse_args()
+
+    main(Path(args.input_dir), Path(args.output_dir), args.to, args.compression)
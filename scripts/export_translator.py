@@ -0,0 +1,58 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+from pathlib import Path
+
+import gin
+
+from modules import translator, utils
+
+gin.parse_config_file('configs/utils.gin')
+gin.parse_config_file('configs/translator_inference.gin')
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main(model_path: Path, out_dir: Path, formats: list[str]):
+    """Export the feature head of the h5 weights, as `<stem>_saved_model/` and `<stem>.tflite` in out_dir."""
+    feature_model = translator.feature_encoder.get_feature_model(model_path.as_posix())
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if "saved_model" in formats:
+        saved_model_dir = out_dir / (model_path.stem + "_saved_model")
+        translator.feature_encoder.export_saved_model(feature_model, saved_model_dir)
+        logging.info(f"SavedModel written to {saved_model_dir}.")
+
+    if "tflite" in formats:
+        tflite_path = out_dir / (model_path.stem + ".tflite")
+        size = translator.feature_encoder.export_tflite(feature_model, tflite_path)
+        logging.info(f"TFLite model written to {tflite_path} ({size / 1e6:.2f} MB).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path',
+                        default=gin.query_parameter('modules.translator.translator_manager.TranslatorManager.model_path'),
+                        help="h5 weights of the full model.")
+    parser.add_argument('--out_dir', default="checkpoints/translator/export")
+    parser.add_argument('--formats',
+                        nargs="+",
+                        default=["saved_model", "tflite"],
+                        choices=["saved_model", "tflite"],
+                        help="Artifacts to write, set TranslatorManager.model_path to one of them.")
+    args = parser.parse_args()
+
+    main(Path(args.model_path), Path(args.out_dir), args.formats)
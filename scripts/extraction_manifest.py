@@ -0,0 +1,117 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from modules import utils
+
+
+def file_hash(fpath: Path, chunk_size: int = 1 << 20) -> str:
+    sha1 = hashlib.sha1()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class ExtractionManifest():
+    """Record of the videos already extracted, one JSON line per video.
+
+    Lines are only appended, a later line for the same video replaces the earlier one.
+    Each entry holds the video size, mtime, content hash and the h5 groups it was written to.
+
+    Changes of the h5 files are written ahead: a pending entry names the groups being deleted, or the first group
+    being appended, before the file is touched. An entry still pending when the manifest is opened was
+    interrupted, `reconcile` drops its groups so the video is extracted again, without duplicates.
+    """
+
+    def __init__(self, manifest_path: Path):
+        self.manifest_path = Path(manifest_path)
+        self.entries = {}
+
+        if self.manifest_path.is_file():
+            with open(self.manifest_path, "r") as f:
+                for line in f:
+                    if line.strip() == "":
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("dropped", False):
+                        self.entries.pop(entry["video"], None)
+                    else:
+                        self.entries[entry["video"]] = entry
+
+    def get(self, key: str) -> dict:
+        return self.entries.get(key)
+
+    def is_done(self, key: str, video_path: Path) -> bool:
+        """Check if the video was extracted and is unchanged, hashing only when size or mtime differ."""
+        entry = self.entries.get(key)
+        if entry is None or entry.get("pending", False):
+            return False
+
+        stat = video_path.stat()
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return True
+
+        if entry["size"] == stat.st_size and entry["hash"] == file_hash(video_path):
+            # Touched but same content.
+            self.record(key, video_path, entry["h5"], entry["groups"], content_hash=entry["hash"])
+            return True
+
+        return False
+
+    def write(self, entry: dict):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def record(self, key: str, video_path: Path, h5_name: str, groups: list[str], content_hash: str = None):
+        stat = video_path.stat()
+        entry = {
+            "video": key,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": content_hash or file_hash(video_path),
+            "h5": h5_name,
+            "groups": groups,
+        }
+        self.entries[key] = entry
+        self.write(entry)
+
+    def record_pending(self, key: str, h5_name: str, groups: list[str] = None, next_group: int = None):
+        """Write ahead a change of `h5_name`: deletion of `groups`, or an append starting at group `next_group`."""
+        entry = {"video": key, "pending": True, "h5": h5_name, "groups": groups or [], "next_group": next_group}
+        self.entries[key] = entry
+        self.write(entry)
+
+    def drop(self, key: str):
+        self.entries.pop(key, None)
+        self.write({"video": key, "dropped": True})
+
+    def reconcile(self) -> int:
+        """Undo the h5 changes of interrupted videos and forget them. Returns the number of videos."""
+        pending = [entry for entry in self.entries.values() if entry.get("pending", False)]
+        for entry in pending:
+            h5_path = self.manifest_path.parent / entry["h5"]
+            groups = list(entry["groups"])
+            if entry["next_group"] is not None:
+                groups += utils.file_utils.groups_from_h5(h5_path, entry["next_group"])
+            logging.warning(f"Extraction of {entry['video']} was interrupted, dropping {len(groups)} groups "
+                            f"of {h5_path}.")
+            utils.file_utils.delete_groups_h5(h5_path, groups)
+            self.drop(entry["video"])
+        return len(pending)
@@ -0,0 +1,159 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import gin
+import numpy as np
+import numpy.typing as npt
+
+from modules import translator, utils
+
+gin.parse_config_file('configs/utils.gin')
+gin.parse_config_file('configs/translator_inference.gin')
+
+logging.basicConfig(level=logging.INFO)
+
+VARIANTS = ["float32", "float16", "int8"]
+
+
+def calibration_dataset(skeleton_dir: Path, n_frames: int, n_batches: int, batch_size: int):
+    """Representative dataset of the int8 converter, augmented `DataGenerator` batches yielded one clip at a time."""
+    labels = {p.stem: [i] for i, p in enumerate(sorted(skeleton_dir.glob("*.h5")))}
+    data_generator = translator.DataGenerator(root_folder=skeleton_dir,
+                                              batch_size=batch_size,
+                                              labels=labels,
+                                              n_frames=n_frames,
+                                              lazy=True)
+
+    def representative_dataset():
+        for i in range(n_batches):
+            inputs, _ = data_generator.__getitem__(i, hards=None)
+            for j in range(batch_size):
+                # Keyed by input name, the converter doesn't keep the input order.
+                yield {name: x[j:j + 1] for name, x in zip(translator.feature_encoder.INPUT_NAMES, inputs)}
+
+    return representative_dataset
+
+
+def cosine_drift(feats: npt.ArrayLike, ref_feats: npt.ArrayLike) -> npt.ArrayLike:
+    """1 - cosine similarity of each row of `feats` with the same row of `ref_feats`."""
+    norms = np.linalg.norm(feats, axis=1) * np.linalg.norm(ref_feats, axis=1)
+    # Clipped, float rounding gives tiny negative values for identical features.
+    return np.maximum(1. - np.sum(feats * ref_feats, axis=1) / np.maximum(norms, 1e-12), 0.)
+
+
+def call_latency_ms(translator_manager: translator.TranslatorManager, vid_res: dict, n_calls: int) -> float:
+    vid_res = translator_manager.preprocess_input(vid_res, translator_manager.n_frames)
+    translator_manager.get_feats_sampled(vid_res)
+    latencies = []
+    for _ in range(n_calls):
+        t1 = time.perf_counter()
+        translator_manager.get_feats_sampled(vid_res)
+        latencies.append(time.perf_counter() - t1)
+    return float(np.percentile(latencies, 50)) * 1000
+
+
+def main(skeleton_dir: Path, model_path: Path, out_dir: Path, eval_dir: Path, n_calib_batches: int, k: int,
+         n_calls: int):
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # 1. Variants of the feature head.
+    feature_model = translator.feature_encoder.get_feature_model(model_path.as_posix())
+    n_frames = feature_model.inputs[0].shape[1]
+    variant_paths = {}
+    for variant in VARIANTS:
+        variant_paths[variant] = out_dir / f"{model_path.stem}_{variant}.tflite"
+        quantization = None if variant == "float32" else variant
+        representative_dataset = None
+        if variant == "int8":
+            representative_dataset = calibration_dataset(skeleton_dir, n_frames, n_calib_batches, batch_size=32)
+        size = translator.feature_encoder.export_tflite(feature_model, variant_paths[variant], quantization,
+                                                        representative_dataset)
+        logging.info(f"{variant} written to {variant_paths[variant]} ({size / 1e6:.2f} MB).")
+
+    # 2. Features of the evaluation clips, with the float32 h5 model as reference.
+    skeleton_ds = utils.file_utils.load_skeleton_h5(eval_dir)
+    clips, true_glosses = [], []
+    for gloss, vid_res_list in sorted(skeleton_ds.items()):
+        clips.extend(vid_res_list)
+        true_glosses.extend([gloss] * len(vid_res_list))
+    true_glosses = np.array(true_glosses)
+    logging.info(f"Comparing on {len(clips)} clips.")
+
+    ref_manager = translator.TranslatorManager(model_path=model_path.as_posix())
+    assert ref_manager.load_knn_database(), "[ERROR] Empty KNN database, run scripts.skeleton_to_knn first."
+    ref_feats = ref_manager.get_feats_batch(clips)
+    ref_glosses = ref_manager.run_knn_batch(ref_feats, k=k)[0]
+
+    report = {
+        "reference": {
+            "model": model_path.as_posix(),
+            "size_mb": model_path.stat().st_size / 1e6,
+            "p50_ms": call_latency_ms(ref_manager, clips[0], n_calls),
+            "top1_acc": float(np.mean(ref_glosses == true_glosses)),
+        }
+    }
+
+    # 3. Each variant against the reference, searched in the same float32 KNN database.
+    for variant, path in variant_paths.items():
+        translator_manager = translator.TranslatorManager(model_path=path.as_posix())
+        translator_manager.load_knn_database()
+        feats = translator_manager.get_feats_batch(clips)
+        glosses = translator_manager.run_knn_batch(feats, k=k)[0]
+        drift = cosine_drift(feats, ref_feats)
+
+        report[variant] = {
+            "model": path.as_posix(),
+            "size_mb": path.stat().st_size / 1e6,
+            "p50_ms": call_latency_ms(translator_manager, clips[0], n_calls),
+            "top1_agreement": float(np.mean(glosses == ref_glosses)),
+            "top1_acc": float(np.mean(glosses == true_glosses)),
+            "cosine_drift_mean": float(np.mean(drift)),
+            "cosine_drift_p95": float(np.percentile(drift, 95)),
+            "cosine_drift_max": float(np.max(drift)),
+        }
+
+    with open(out_dir / "quantization_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'variant':12s} {'size':>8s} {'p50':>8s} {'agree':>7s} {'acc':>7s} {'drift':>9s} {'p95':>9s} {'max':>9s}")
+    for variant, res in report.items():
+        print(f"{variant:12s} {res['size_mb']:6.2f}MB {res['p50_ms']:6.2f}ms {res.get('top1_agreement', 1.):7.3f} "
+              f"{res['top1_acc']:7.3f} {res.get('cosine_drift_mean', 0.):9.2e} {res.get('cosine_drift_p95', 0.):9.2e} "
+              f"{res.get('cosine_drift_max', 0.):9.2e}")
+    logging.info(f"Report written to {out_dir / 'quantization_report.json'}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('skeleton_dir', help="h5 corpus sampled by DataGenerator for the int8 calibration.")
+    parser.add_argument('--model_path',
+                        default=gin.query_parameter('modules.translator.translator_manager.TranslatorManager.model_path'),
+                        help="h5 weights of the float32 model.")
+    parser.add_argument('--out_dir', default="checkpoints/translator/export")
+    parser.add_argument('--eval_dir', default=None, help="h5 clips of the comparison, defaults to skeleton_dir.")
+    parser.add_argument('--n_calib_batches', default=8, type=int, help="Calibration batches of 32 clips.")
+    parser.add_argument('--k', default=5, type=int)
+    parser.add_argument('--n_calls', default=100, type=int, help="Calls of batch size 1 for the latency.")
+    args = parser.parse_args()
+
+    skeleton_dir = Path(args.skeleton_dir)
+    eval_dir = skeleton_dir if args.eval_dir is None else Path(args.eval_dir)
+    main(skeleton_dir, Path(args.model_path), Path(args.out_dir), eval_dir, args.n_calib_batches, args.k,
+         args.n_calls)
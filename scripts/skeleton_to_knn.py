@@ -13,7 +13,6 @@
 # limitations under the License.
 
 import argparse
-import copy
 import logging
 from pathlib import Path
 
@@ -27,10 +26,12 @@ gin.parse_config_file('configs/translator_inference.gin')
 logging.basicConfig(level=logging.DEBUG)
 
 
-def main(input_dir: Path, min_vid: int):
+def main(input_dir: Path, min_vid: int, use_filter_cache: bool):
     translator_manager = translator.TranslatorManager()
     # Load skeleton.
     logging.info(f"Output dir: {translator_manager.knn_dir.as_posix()}")
+    if use_filter_cache:
+        input_dir = utils.filter_cache.build_filter_cache(input_dir)
     logging.info("Loading skeleton h5...")
     skeleton_ds = utils.file_utils.load_skeleton_h5(input_dir)
 
@@ -46,18 +47,11 @@ def main(input_dir: Path, min_vid: int):
         # First chunk.
         knn_records = []
 
-        vid_list_clone = copy.deepcopy(vid_res_list)
-        for vid_res in vid_list_clone:
-            feats = translator_manager.get_feats(vid_res)
-            knn_records.append(feats)
+        knn_records.extend(translator_manager.get_feats_batch(vid_res_list))
 
-        # Augment chunks.
-        for _ in range(n_repeat - 1):
-            # Deep copy to avoid data altered from inplace augmentation.
-            vid_list_clone = copy.deepcopy(vid_res_list)
-            for vid_res in vid_list_clone:
-                feats = translator_manager.get_feats(vid_res, is_augment=True)
-                knn_records.append(feats)
+        # Augment chunks, all repeats in one batched call.
+        # Preprocessing and augmentation don't modify the inputs, the same videos can be repeated.
+        knn_records.extend(translator_manager.get_feats_batch(vid_res_list * (n_repeat - 1), is_augment=True))
 
         logging.info(
             f" {str(i)}/{len(skeleton_ds.items())} \t {k_name} \t\t\t total_vid: {total_vid} -> {len(knn_records)} ")
@@ -73,8 +67,11 @@ if __name__ == "__main__":
                         type=int,
                         required=False,
                         help="Repeat the dataset till the number exceeds this value.")
+    parser.add_argument('--use_filter_cache',
+                        action='store_true',
+                        help="Apply filter_visibility once and reuse the result on later runs.")
     args = parser.parse_args()
 
     input_dir = Path(args.input_dir)
 
-    main(input_dir, args.min_vid)
+    main(input_dir, args.min_vid, args.use_filter_cache)
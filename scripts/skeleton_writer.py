@@ -65,25 +65,30 @@ class SkeletonWriter():
                 "n_frames": n_frames
             }
 
-            self.dump_list.append(vid_res)
+            self.add_video(vid_res)
         else:
             logging.warning("Video too short, skipped.")
 
         self.reset(clear_dump=False)
 
-    def finish_file(self, h5_path: Path):
-        if self.dump_list == []:
-            return
+    def add_video(self, vid_res: dict):
+        """Add a finished video, e.g. extracted by another process."""
+        self.dump_list.append(vid_res)
 
-        to_dump = []
+    def finish_file(self, h5_path: Path, h5_format: int = 1, compression: str = None) -> list[str]:
+        if self.dump_list == []:
+            return []
 
-        # Merge to old skeleton file, if exist.
+        # Append to old skeleton file in place, if exist, keeping its format.
         if h5_path.is_file():
-            logging.info(f"Found old file at {h5_path}, merging new videos to the list.")
-            old_list = utils.file_utils.open_dataset_h5(h5_path)
-            to_dump.extend(old_list)
+            logging.info(f"Found old file at {h5_path}, appending new videos.")
+            group_names = utils.file_utils.append_dataset_h5(h5_path, self.dump_list)
+        elif h5_format == 2:
+            clip_ids = utils.file_utils.append_dataset_h5_v2(h5_path, self.dump_list, compression)
+            group_names = [str(i) for i in clip_ids]
+        else:
+            group_names = utils.file_utils.append_dataset_h5(h5_path, self.dump_list)
 
-        to_dump.extend(self.dump_list)
-        utils.file_utils.write_dataset_h5(h5_path, to_dump)
         self.reset(clear_dump=True)
         logging.info(f"Write output file at {h5_path}.")
+        return group_names
@@ -13,105 +13,179 @@
 # limitations under the License.
 
 import argparse
-import glob
-import os
-import posixpath
-import random
+import csv
+import json
+import logging
 import time
+from pathlib import Path
 
-import cv2
+import gin
 import numpy as np
-from constants import *
-from crop_utils import letterbox_image
-from tqdm import tqdm
-from utils import *
-
-from pipeline import Pipeline
-
-realtime_pipeline = Pipeline()
-realtime_pipeline.load_database()
-
-# skip some frame for faster speed.
-SKIP_FRAME = 2
-
-KNN_DATASET_PATH = "knn_dataset"
-
-
-class Application(Pipeline):
-
-    def __init__(self, root_folder):
-        self.root_folder = os.path.normpath(root_folder)
-
-        self.sign_folders = glob.glob(os.path.join(root_folder, "*"))
-
-    def process(self):
-        for f in self.sign_folders:
-
-            vids_path = glob.glob(os.path.join(f, "*.mp4"))
-            random.shuffle(vids_path)
-
-            correct = 0
-            correct5 = 0
-            fail = []
-            assert len(vids_path) > 1
-            for v_path in vids_path:
-                v_path = os.path.normpath(v_path)
-
-                cap = cv2.VideoCapture(v_path)
-                ret, frame = cap.read()
-                num_frame = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                frame_idx = 0
-
-                for frame_idx in range(num_frame - 1):
-
-                    ret, frame = cap.read()
-                    if frame_idx % SKIP_FRAME == 0:
-
-                        frame = letterbox_image(frame, 480)
-                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        t1 = time.time()
-
-                        realtime_pipeline.update(frame_rgb)
-
-                        cv2.imshow("frame", frame_rgb)
-                        key = cv2.waitKey(1)
-                        if key == ord("q"):
-                            cap.release()
-                            cv2.destroyAllWindows()
-                            exit()
-
-                true_name = os.path.basename(os.path.dirname(v_path))
-                feats = realtime_pipeline.get_feats(reset=True)
-                result_class_name = realtime_pipeline.run_knn(feats)
-
-                if result_class_name == true_name:
-                    correct += 1
-                # if true_name in top_k_result:
-                #     correct5 += 1
-                else:
-                    fail.append([os.path.split(v_path)[-1], result_class_name])
-
-            print("=" * 10)
-            print(true_name)
-            print("top1 {}/{}   top5 {}/{}".format(correct, len(vids_path), correct5, len(vids_path)))
-
-            # print("[INFO] Failure caess ", fail)
-
-            log_path = os.path.join(f, "log.txt")
-            if os.path.isfile(log_path):
-                os.remove(log_path)
-
-            if len(fail) > 0:
-                with open(log_path, "w") as outfile:
-                    outfile.write("\n".join(str(item) for item in fail))
+import numpy.typing as npt
+
+from modules import translator, utils
+
+gin.parse_config_file('configs/utils.gin')
+gin.parse_config_file('configs/translator_inference.gin')
+
+logging.basicConfig(level=logging.INFO)
+
+
+def extract_skeletons(video_dir: Path, skeleton_dir: Path, num_workers: int, target_fps: float) -> dict:
+    """Extract the labelled video tree, videos already in skeleton_dir are skipped."""
+    # Needs MediaPipe, only imported when there are videos to extract.
+    from . import video_to_skeleton
+    return video_to_skeleton.main(video_dir,
+                                  skeleton_dir,
+                                  draw_mode="none",
+                                  num_workers=num_workers,
+                                  headless=True,
+                                  h5_format=2,
+                                  compression=None,
+                                  target_fps=target_fps)
+
+
+def confusion_matrix(true_glosses: list[str], pred_glosses: list[str]) -> tuple[list[str], npt.ArrayLike]:
+    """Counts [true, predicted], over the sorted glosses of both lists."""
+    glosses = sorted(set(true_glosses) | set(pred_glosses))
+    gloss_ids = {g: i for i, g in enumerate(glosses)}
+    matrix = np.zeros([len(glosses), len(glosses)], dtype=np.int64)
+    np.add.at(matrix, ([gloss_ids[g] for g in true_glosses], [gloss_ids[g] for g in pred_glosses]), 1)
+    return glosses, matrix
+
+
+def rank_glosses(pred_glosses: npt.ArrayLike, neighbour_glosses: npt.ArrayLike, top_n: int) -> npt.ArrayLike:
+    """Best `top_n` distinct glosses of each clip [N, top_n], padded with "" when the neighbours hold fewer glosses.
+
+    The voted gloss comes first, then the others by the distance of their nearest neighbour.
+
+    Args:
+        pred_glosses (npt.ArrayLike): Voted gloss [N].
+        neighbour_glosses (npt.ArrayLike): Glosses of the nearest neighbours sorted by distance [N, n_neighbours].
+        top_n (int): Number of glosses.
+    """
+    ranked = np.full([len(pred_glosses), top_n], "", dtype=object)
+    for i, (pred_gloss, glosses) in enumerate(zip(pred_glosses, neighbour_glosses)):
+        distinct = [g for g in dict.fromkeys([pred_gloss, *glosses]) if g != ""][:top_n]
+        ranked[i, :len(distinct)] = distinct
+    return ranked
+
+
+def main(video_dir: Path,
+         skeleton_dir: Path,
+         out_dir: Path,
+         num_workers: int,
+         k: int,
+         top_n: int,
+         n_neighbours: int,
+         target_fps: float = None):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    throughput = {}
+    per_video = []
+
+    # 1. Skeletons, reusing the h5 files of a previous run.
+    if video_dir is not None:
+        stats = extract_skeletons(video_dir, skeleton_dir, num_workers, target_fps)
+        per_video = stats["per_video"]
+        throughput["extraction_videos_per_s"] = stats["videos"] / max(stats["seconds"], 1e-9)
+        throughput["extraction_frames_per_s"] = stats["frames"] / max(stats["seconds"], 1e-9)
+
+    skeleton_ds = utils.file_utils.load_skeleton_h5(skeleton_dir)
+    clips, true_glosses, clip_ids = [], [], []
+    for gloss, vid_res_list in sorted(skeleton_ds.items()):
+        clips.extend(vid_res_list)
+        true_glosses.extend([gloss] * len(vid_res_list))
+        clip_ids.extend(range(len(vid_res_list)))
+    logging.info(f"Evaluating {len(clips)} clips of {len(skeleton_ds)} glosses.")
+
+    translator_manager = translator.TranslatorManager()
+    assert translator_manager.load_knn_database(), "[ERROR] Empty KNN database, run scripts.skeleton_to_knn first."
+
+    # 2. Features, in batches.
+    t1 = time.perf_counter()
+    feats = translator_manager.get_feats_batch(clips)
+    throughput["features_clips_per_s"] = len(clips) / max(time.perf_counter() - t1, 1e-9)
+
+    # 3. KNN vote over k neighbours, in one pass.
+    t1 = time.perf_counter()
+    pred_glosses = translator_manager.run_knn_batch(feats, k=k)[0]
+    throughput["knn_queries_per_s"] = len(clips) / max(time.perf_counter() - t1, 1e-9)
+
+    # Gloss ranking, over more neighbours than the vote so that it holds top_n distinct glosses.
+    neighbour_glosses = translator_manager.run_knn_batch(feats, k=max(n_neighbours, k))[1]
+    ranked_glosses = rank_glosses(pred_glosses, neighbour_glosses, top_n)
+
+    true_glosses = np.array(true_glosses)
+    top1 = pred_glosses == true_glosses
+    topn = np.any(ranked_glosses == true_glosses[:, np.newaxis], axis=1)
+
+    glosses, matrix = confusion_matrix(true_glosses.tolist(), pred_glosses.tolist())
+    with open(out_dir / "confusion_matrix.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["true \\ predicted"] + glosses)
+        for gloss, row in zip(glosses, matrix):
+            writer.writerow([gloss] + row.tolist())
+
+    per_gloss = {}
+    for gloss in np.unique(true_glosses):
+        mask = true_glosses == gloss
+        per_gloss[gloss] = {
+            "clips": int(mask.sum()),
+            "top1": float(top1[mask].mean()),
+            f"top{top_n}": float(topn[mask].mean())
+        }
+
+    failures = [{
+        "gloss": true_glosses[i],
+        "clip": clip_ids[i],
+        "predicted": pred_glosses[i]
+    } for i in np.flatnonzero(~top1)]
+
+    report = {
+        "clips": len(clips),
+        "top1": float(top1.mean()),
+        f"top{top_n}": float(topn.mean()),
+        "k": k,
+        "throughput": throughput,
+        "per_gloss": per_gloss,
+        "failures": failures,
+        "extraction": per_video,
+    }
+    with open(out_dir / "report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("=" * 10)
+    for gloss, res in per_gloss.items():
+        print(f"{gloss:24s} top1 {res['top1']:.3f}  top{top_n} {res[f'top{top_n}']:.3f}  ({res['clips']} clips)")
+    print("=" * 10)
+    print(f"top1 {top1.sum()}/{len(clips)} ({top1.mean():.3f})   "
+          f"top{top_n} {topn.sum()}/{len(clips)} ({topn.mean():.3f})")
+    for name, value in throughput.items():
+        print(f"{name:28s} {value:10.1f}")
+    logging.info(f"Report and confusion matrix written to {out_dir}.")
 
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('root_folder')
+    parser.add_argument('skeleton_dir', help="h5 files of the test set, one per gloss.")
+    parser.add_argument('--video_dir',
+                        default=None,
+                        help="Labelled video tree, one folder per gloss, extracted to skeleton_dir first.")
+    parser.add_argument('--out_dir', default="eval_results")
+    parser.add_argument('--num_workers', default=4, type=int, help="Extraction processes.")
+    parser.add_argument('--target_fps',
+                        default=None,
+                        type=float,
+                        help="Frames per second kept by the extraction, None keeps every frame.")
+    parser.add_argument('--k', default=5, type=int, help="Number of neighbours of the top-1 vote.")
+    parser.add_argument('--top_n', default=5, type=int, help="Number of distinct glosses of the top-n accuracy.")
+    parser.add_argument('--n_neighbours',
+                        default=50,
+                        type=int,
+                        help="Neighbours searched for the top-n gloss ranking.")
     args = parser.parse_args()
 
-    app = Application(args.root_folder)
-    app.load_database()
-    app.process()
+    video_dir = None if args.video_dir is None else Path(args.video_dir)
+    main(video_dir, Path(args.skeleton_dir), Path(args.out_dir), args.num_workers, args.k, args.top_n,
+         args.n_neighbours, args.target_fps)
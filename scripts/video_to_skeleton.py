@@ -13,7 +13,10 @@
 # limitations under the License.
 
 import argparse
+import functools
 import logging
+import multiprocessing
+import time
 from pathlib import Path
 
 import cv2
@@ -22,85 +25,205 @@ from tqdm import tqdm
 
 from modules import holistic, utils
 
-from . import skeleton_writer
+from . import extraction_manifest, skeleton_writer
 
 gin.parse_config_file('configs/holistic.gin')
 
-holistic = holistic.HolisticManager()
-
 logging.basicConfig(level=logging.DEBUG)
 
 VIDEO_SIZE = 480
 
+MANIFEST_NAME = "manifest.jsonl"
 
-def main(input_dir: Path, out_dir: Path):
+STATUSES = ["ok", "skipped", "failed"]
 
-    all_folders = [d for d in input_dir.iterdir() if d.is_dir()]
-    num_folders = len(all_folders)
-    logging.info(f"Found {num_folders} folders.")
-    assert num_folders > 0
+# One holistic instance per worker process.
+worker_holistic = None
 
-    # Make output folder
-    out_dir.parent.mkdir(parents=True, exist_ok=True)
 
+def init_worker(draw_mode: str):
+    global worker_holistic
+    worker_holistic = holistic.HolisticManager(draw_mode=draw_mode)
+
+
+def extract_video(video_path: Path, target_fps: float = None, show: bool = False):
+    """Run holistic on the frames of a video, at most `target_fps` of them per second.
+
+    Returns:
+        tuple: video path, skeleton dict or None, throughput stats of the video. `stats["status"]` is one of
+            `STATUSES`: "ok" with a skeleton, "skipped" for a video without frames or too short, "failed" for a
+            video that couldn't be opened or processed, which is retried by the next run.
+    """
     skel_writer = skeleton_writer.SkeletonWriter()
+    stats = {
+        "video": video_path.as_posix(),
+        "status": "failed",
+        "frames": 0,
+        "grabbed": 0,
+        "read_seconds": 0.,
+        "seconds": 0.
+    }
+    t1 = time.perf_counter()
+    try:
+        with utils.video_reader.VideoReader(video_path, VIDEO_SIZE, target_fps) as reader:
+            if not reader.is_opened:
+                logging.warning(f"Can't open {video_path}, skipped.")
+                return video_path, None, stats
+
+            for frame_rgb in reader:
+                # Detect frame with holistic.
+                frame_res = worker_holistic(frame_rgb)
+                stats["frames"] += 1
+
+                skel_writer.add_keypoints(frame_res)
+
+                if show:
+                    cv2.imshow("", cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR))
 
-    for folder in all_folders:
+                    key = cv2.waitKey(1)
 
-        # Get all video in folder.
-        all_vid_path = [v for v in folder.glob("*.mp4")]
-        num_videos = len(all_vid_path)
-        logging.info(f"Globing {folder} Found {num_videos} videos.")
+                    if key == ord("q"):
+                        cv2.destroyAllWindows()
+                        exit()
 
-        if num_videos < 0:
-            logging.warning(f"No video, skipped.")
+            stats["grabbed"] = reader.n_grabbed
+            stats["read_seconds"] = reader.seconds
 
-        # Read each video.
-        for video_path in tqdm(all_vid_path):
-            try:
-                # Check if video valid.
-                cap = cv2.VideoCapture(video_path.as_posix())
-                ret, frame = cap.read()
-                if not ret or frame is None:
-                    logging.warning(f"Frame invalid {video_path}, finish video")
-                    skel_writer.finish_video()
-                    continue
+        if stats["frames"] == 0:
+            logging.warning(f"Frame invalid {video_path}, finish video")
+            stats["status"] = "skipped"
+            return video_path, None, stats
 
-                num_frame = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # wrapup video.
+        skel_writer.finish_video()
+    except Exception as e:
+        logging.warning(f"Can't process {video_path}, skipped: {e}")
+        return video_path, None, stats
+    finally:
+        stats["seconds"] = time.perf_counter() - t1
 
-                # Read each frame.
-                frame_control = 0
-                while frame_control < num_frame - 1:
-                    ret, frame = cap.read()
+    # Too short videos are dropped by finish_video.
+    vid_res = skel_writer.dump_list[0] if len(skel_writer.dump_list) > 0 else None
+    stats["status"] = "ok" if vid_res is not None else "skipped"
+    return video_path, vid_res, stats
 
-                    frame_control += 1
 
-                    frame = utils.crop_utils.letterbox_image(frame, VIDEO_SIZE)
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+def video_key(input_dir: Path, video_path: Path) -> str:
+    return video_path.relative_to(input_dir).as_posix()
 
-                    # Detect frame with holistic.
-                    frame_res = holistic(frame_rgb)
 
-                    skel_writer.add_keypoints(frame_res)
+def main(input_dir: Path,
+         out_dir: Path,
+         draw_mode: str,
+         num_workers: int,
+         headless: bool,
+         h5_format: int,
+         compression: str,
+         target_fps: float = None) -> dict:
+    """Extract new or changed videos.
 
-                    cv2.imshow("", cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR))
+    Failed videos are not recorded in the manifest, the next run retries them.
 
-                    key = cv2.waitKey(1)
+    Returns:
+        dict: Number of videos, frames and the elapsed seconds, the number of videos of each status in "statuses",
+            and the stats of each video in "per_video".
+    """
 
-                    if key == ord("q"):
-                        cap.release()
-                        cv2.destroyAllWindows()
-                        exit()
+    all_folders = [d for d in input_dir.iterdir() if d.is_dir()]
+    num_folders = len(all_folders)
+    logging.info(f"Found {num_folders} folders.")
+    assert num_folders > 0
 
-                # wrapup video.
-                skel_writer.finish_video()
-            except Exception as e:
-                logging.warning(f"Can't process {video_path}, skipped.")
-                skel_writer.reset(clear_dump=False)
+    # Make output folder
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Videos already extracted by a previous run, an interrupted one is extracted again.
+    manifest = extraction_manifest.ExtractionManifest(out_dir / MANIFEST_NAME)
+    manifest.reconcile()
+
+    # Get all new or changed videos in each folder.
+    all_vid_path = []
+    for folder in all_folders:
+        folder_vids = [v for v in folder.glob("*.mp4")]
+        logging.info(f"Globing {folder} Found {len(folder_vids)} videos.")
+
+        if len(folder_vids) == 0:
+            logging.warning(f"No video, skipped.")
+            continue
+
+        todo_vids = [v for v in folder_vids if not manifest.is_done(video_key(input_dir, v), v)]
+        if len(todo_vids) < len(folder_vids):
+            logging.info(f"Skipping {len(folder_vids) - len(todo_vids)} already extracted videos.")
+        all_vid_path.extend(todo_vids)
+
+    skel_writer = skeleton_writer.SkeletonWriter()
 
-        # write h5 contain all video.
-        h5_name = folder.name + ".h5"
-        skel_writer.finish_file(out_dir / h5_name)
+    if num_workers > 1 and not headless:
+        logging.info("Preview is only available with a single worker, running headless.")
+        headless = True
+
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers, initializer=init_worker, initargs=(draw_mode,))
+        results = pool.imap_unordered(functools.partial(extract_video, target_fps=target_fps), all_vid_path)
+    else:
+        pool = None
+        init_worker(draw_mode)
+        results = (extract_video(v, target_fps, show=not headless) for v in all_vid_path)
+
+    t_start = time.perf_counter()
+    total_frames = 0
+    statuses = {status: 0 for status in STATUSES}
+    per_video = []
+    for video_path, vid_res, stats in tqdm(results, total=len(all_vid_path)):
+        total_frames += stats["frames"]
+        statuses[stats["status"]] += 1
+        per_video.append(stats)
+        logging.debug(f"{video_path}: {stats['frames']}/{stats['grabbed']} frames in {stats['seconds']:.2f} s "
+                      f"({stats['frames'] / max(stats['seconds'], 1e-9):.1f} frames/s, "
+                      f"read {stats['read_seconds']:.2f} s).")
+        if stats["status"] == "failed":
+            # Not recorded, a previous result of the video is kept until it's extracted again.
+            continue
+
+        gloss_name = video_path.parent.name
+
+        h5_path = out_dir / (gloss_name + ".h5")
+        key = video_key(input_dir, video_path)
+
+        # Changed video, drop its previous result. Every h5 change is written ahead in the manifest, the next run
+        # undoes it if it's interrupted before the final entry.
+        old_entry = manifest.get(key)
+        if old_entry is not None and len(old_entry["groups"]) > 0:
+            manifest.record_pending(key, old_entry["h5"], groups=old_entry["groups"])
+            utils.file_utils.delete_groups_h5(out_dir / old_entry["h5"], old_entry["groups"])
+
+        # Append to the gloss h5 right away, so an interrupted run can resume.
+        groups = []
+        if vid_res is not None:
+            manifest.record_pending(key, h5_path.name, next_group=utils.file_utils.next_group_h5(h5_path))
+            skel_writer.add_video(vid_res)
+            groups = skel_writer.finish_file(h5_path, h5_format, compression)
+
+        manifest.record(key, video_path, h5_path.name, groups)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    elapsed = time.perf_counter() - t_start
+    logging.info(f"Processed {len(all_vid_path)} videos, {total_frames} frames in {elapsed:.1f} s "
+                 f"({len(all_vid_path) / max(elapsed, 1e-9):.2f} videos/s, "
+                 f"{total_frames / max(elapsed, 1e-9):.1f} frames/s) with {num_workers} workers.")
+    if statuses["failed"] > 0:
+        logging.warning(f"{statuses['failed']} videos failed, they are retried by the next run.")
+
+    return {
+        "videos": len(all_vid_path),
+        "frames": total_frames,
+        "seconds": elapsed,
+        "statuses": statuses,
+        "per_video": per_video
+    }
 
 
 if __name__ == "__main__":
@@ -108,7 +231,27 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('input_dir')
     parser.add_argument('output_dir')
+    parser.add_argument('--draw_mode',
+                        default="none",
+                        choices=["none", "sparse", "full"],
+                        help="Overlay drawn on the preview window.")
+    parser.add_argument('--num_workers',
+                        default=1,
+                        type=int,
+                        help="Number of extraction processes, each with its own holistic instance.")
+    parser.add_argument('--headless', action='store_true', help="Don't show the preview window.")
+    parser.add_argument('--h5_format',
+                        default=1,
+                        type=int,
+                        choices=[1, 2],
+                        help="Layout of new h5 files: 1 one group per video, 2 concatenated chunked datasets.")
+    parser.add_argument('--compression', default=None, choices=["gzip", "lzf"], help="Compression of v2 files.")
+    parser.add_argument('--target_fps',
+                        default=None,
+                        type=float,
+                        help="Keep at most this many frames per second, the others are skipped without decoding.")
 
     args = parser.parse_args()
 
-    main(Path(args.input_dir), Path(args.output_dir))
+    main(Path(args.input_dir), Path(args.output_dir), args.draw_mode, args.num_workers, args.headless,
+         args.h5_format, args.compression, args.target_fps)
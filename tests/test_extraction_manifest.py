@@ -0,0 +1,74 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from modules import utils
+from scripts import extraction_manifest
+
+
+def random_clip(n_frames: int) -> dict:
+    rng = np.random.default_rng(n_frames)
+    vid_res = {part: rng.random([n_frames, 5, 3]).astype(np.float32) for part in utils.file_utils.BODY_PARTS}
+    vid_res["n_frames"] = n_frames
+    return vid_res
+
+
+def append(h5_path, h5_format: int, vid_res: dict) -> list[str]:
+    if h5_format == 2 and not h5_path.is_file():
+        return [str(i) for i in utils.file_utils.append_dataset_h5_v2(h5_path, [vid_res])]
+    return utils.file_utils.append_dataset_h5(h5_path, [vid_res])
+
+
+@pytest.mark.parametrize("h5_format", [1, 2])
+def test_interrupted_append_is_undone(tmp_path, h5_format):
+    h5_path = tmp_path / "gloss.h5"
+    videos = {name: tmp_path / f"{name}.mp4" for name in ["a", "b"]}
+    for video_path in videos.values():
+        video_path.write_bytes(video_path.name.encode())
+
+    manifest = extraction_manifest.ExtractionManifest(tmp_path / "manifest.jsonl")
+    manifest.record_pending("a", h5_path.name, next_group=utils.file_utils.next_group_h5(h5_path))
+    manifest.record("a", videos["a"], h5_path.name, append(h5_path, h5_format, random_clip(10)))
+    # Interrupted after the append of b, before its final entry.
+    manifest.record_pending("b", h5_path.name, next_group=utils.file_utils.next_group_h5(h5_path))
+    append(h5_path, h5_format, random_clip(12))
+
+    manifest = extraction_manifest.ExtractionManifest(tmp_path / "manifest.jsonl")
+    assert not manifest.is_done("b", videos["b"])
+    assert manifest.reconcile() == 1
+
+    clips = utils.file_utils.open_dataset_h5(h5_path)
+    assert [clip["n_frames"] for clip in clips] == [10]
+    manifest = extraction_manifest.ExtractionManifest(tmp_path / "manifest.jsonl")
+    assert manifest.is_done("a", videos["a"]) and manifest.get("b") is None
+    assert manifest.reconcile() == 0
+
+
+def test_interrupted_update_of_a_changed_video_is_undone(tmp_path):
+    h5_path = tmp_path / "gloss.h5"
+    video_path = tmp_path / "a.mp4"
+    video_path.write_bytes(b"a")
+
+    manifest = extraction_manifest.ExtractionManifest(tmp_path / "manifest.jsonl")
+    groups = append(h5_path, 1, random_clip(10))
+    manifest.record("a", video_path, h5_path.name, groups)
+    # Interrupted before its old groups are deleted.
+    manifest.record_pending("a", h5_path.name, groups=groups)
+
+    manifest = extraction_manifest.ExtractionManifest(tmp_path / "manifest.jsonl")
+    manifest.reconcile()
+    assert utils.file_utils.open_dataset_h5(h5_path) == []
+    assert not manifest.is_done("a", video_path)
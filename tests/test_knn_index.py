@@ -0,0 +1,99 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+from modules.translator import knn_index
+
+
+def random_feats(n_records: int, dim: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal([n_records, dim]).astype(np.float32)
+
+
+def test_ivf_small_cells_are_padded():
+    feats = random_feats(40)
+    index = knn_index.IVFIndex(n_lists=20, n_probe=1).build(feats)
+    queries = random_feats(30, seed=1)
+
+    dists, indices = index.search_batch(queries, k=5)
+
+    assert dists.shape == (30, 5) and indices.shape == (30, 5)
+    # Cells of ~2 records, only the records of the probed cell are returned.
+    cell_sizes = np.diff(index.offsets)[index.assign(queries, index.centroids)]
+    np.testing.assert_array_equal(np.sum(indices >= 0, axis=1), np.minimum(cell_sizes, 5))
+    assert np.any(indices == -1)
+    assert np.all(np.isinf(dists[indices == -1]))
+    assert np.all(np.isfinite(dists[indices >= 0]))
+
+
+def test_ivf_uneven_cells_batch_matches_single():
+    # Two dense clusters and a few outliers give cells of very different sizes.
+    rng = np.random.default_rng(2)
+    feats = np.concatenate([
+        rng.normal(0., .1, [200, 8]),
+        rng.normal(3., .1, [50, 8]),
+        rng.normal(-3., 1., [5, 8]),
+    ]).astype(np.float32)
+    index = knn_index.IVFIndex(n_lists=12, n_probe=2, max_chunk_elements=1000).build(feats)
+    queries = feats[rng.choice(len(feats), 40, replace=False)] + 0.01
+
+    dists, indices = index.search_batch(queries, k=7)
+    for q, d, i in zip(queries, dists, indices):
+        single_d, single_i = index.search(q, k=7)
+        np.testing.assert_array_equal(single_i, i)
+        np.testing.assert_allclose(single_d, d, rtol=1e-5)
+
+
+def test_ivf_probing_all_cells_is_exact():
+    feats = random_feats(300)
+    queries = random_feats(20, seed=3)
+    ivf = knn_index.IVFIndex(n_lists=10, n_probe=10).build(feats)
+    exact = knn_index.BruteForceIndex().build(feats)
+
+    ivf_dists, ivf_indices = ivf.search_batch(queries, k=5)
+    exact_dists, exact_indices = exact.search_batch(queries, k=5)
+
+    np.testing.assert_array_equal(ivf_indices, exact_indices)
+    np.testing.assert_allclose(ivf_dists, exact_dists, rtol=1e-4, atol=1e-4)
+
+
+def test_mode_vote_ignores_padding():
+    label_rank = np.array([0, 1, 2])
+    top_label_ids = np.array([
+        [2, -1, -1, -1, -1],
+        [1, 0, 0, -1, -1],
+        [-1, -1, -1, -1, -1],
+    ])
+
+    label_ids, votes = knn_index.mode_vote(top_label_ids, label_rank)
+
+    np.testing.assert_array_equal(label_ids, [2, 0, -1])
+    np.testing.assert_array_equal(votes, [1, 2, 0])
+
+
+def test_ivf_saved_index_is_reused_until_the_store_changes(tmp_path):
+    feats = random_feats(500)
+    queries = random_feats(20, seed=1)
+    built = knn_index.IVFIndex(n_lists=10, n_probe=2).build(feats, index_dir=tmp_path, version=[500, 1])
+
+    loaded = knn_index.IVFIndex(n_lists=10, n_probe=2)
+    assert loaded.load(tmp_path, [500, 1])
+    assert isinstance(loaded.feats, np.memmap)
+    for expected, actual in zip(built.search_batch(queries, k=5), loaded.search_batch(queries, k=5)):
+        np.testing.assert_array_equal(expected, actual)
+
+    # Grown store, or other build parameters.
+    assert not knn_index.IVFIndex(n_lists=10, n_probe=2).load(tmp_path, [600, 2])
+    assert not knn_index.IVFIndex(n_lists=20, n_probe=2).load(tmp_path, [500, 1])
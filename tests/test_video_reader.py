@@ -0,0 +1,41 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cv2
+import numpy as np
+
+from modules.utils import video_reader
+
+
+def write_clip(video_path, n_frames: int, width: int, height: int):
+    writer = cv2.VideoWriter(video_path.as_posix(), cv2.VideoWriter_fourcc(*"mp4v"), 30, (width, height))
+    for i in range(n_frames):
+        writer.write(np.full((height, width, 3), 20 * i, np.uint8))
+    writer.release()
+
+
+def test_drawing_on_a_frame_doesnt_leak_into_the_next(tmp_path):
+    # 16:9, the 480x480 canvas has a gray border above and below the picture.
+    write_clip(tmp_path / "clip.mp4", n_frames=3, width=640, height=360)
+
+    with video_reader.VideoReader(tmp_path / "clip.mp4", size=480) as reader:
+        f1 = reader.read()
+        border_rows = np.r_[0:reader.dy, reader.dy + reader.nh:480]
+        assert reader.dy > 0 and np.all(f1[border_rows] == 128)
+        # An overlay drawn in place, e.g. a landmark below the picture.
+        cv2.circle(f1, (240, 470), 5, (255, 0, 0), -1)
+        f1[:, :5] = 0
+
+        f2 = reader.read()
+        assert np.all(f2[border_rows] == 128)
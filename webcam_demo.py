@@ -12,9 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
+# Startup times are measured from here.
+T_START = time.perf_counter()
+
+import argparse
 import logging
+import queue
 import sys
-import time
+import threading
 from pathlib import Path
 
 import cv2
@@ -24,16 +31,48 @@ from gui import DemoGUI
 from modules import utils
 from pipeline import Pipeline
 
+logging.basicConfig(level=logging.INFO)
+
 cap = cv2.VideoCapture(0)
 
 
 
 class Application(DemoGUI, Pipeline):
 
-    def __init__(self):
+    def __init__(self, eager: bool = False):
         super().__init__()
+        self.t_start = T_START
+
+        # Capture and inference run in their own threads, Tk only renders.
+        # Queues keep the newest frames, a slow stage drops frames instead of lagging behind.
+        self.capture_queue = utils.realtime.DropOldestQueue(maxsize=1)
+        self.render_queue = utils.realtime.DropOldestQueue(maxsize=1)
+        # Translations are never dropped.
+        self.translation_queue = queue.Queue()
+        self.capture_thread = utils.realtime.CaptureThread(cap, self.capture_queue)
+        self.inference_thread = utils.realtime.WorkerThread(self.process_frame, self.capture_queue, self.render_queue)
+        self.render_counter = utils.realtime.StageCounter()
+
+        self.load_failed = False
+        if eager:
+            self.load_models()
+        else:
+            # The camera is shown while MediaPipe and TensorFlow load.
+            self.loader_thread = threading.Thread(target=self.load_models_thread, daemon=True)
+            self.loader_thread.start()
+
+        self.capture_thread.start()
+        self.inference_thread.start()
+
         self.video_loop()
 
+    def load_models_thread(self):
+        try:
+            self.load_models()
+        except Exception:
+            logging.exception("Loading the models failed.")
+            self.load_failed = True
+
     def show_frame(self, frame_rgb):
         self.frame_rgb_canvas = frame_rgb
         self.update_canvas()
@@ -41,7 +80,12 @@ class Application(DemoGUI, Pipeline):
     def tab_btn_cb(self, event):
         super().tab_btn_cb(event)
         # check database before change from record mode to play mode.
+        # The KNN database is only read here, not at startup.
         if self.is_play_mode:
+            if not self.is_loaded:
+                logging.error("Models are still loading, try again in a few seconds.")
+                self.notebook.select(0)
+                return
             ret = self.translator_manager.load_knn_database()
             if not ret:
                 logging.error("KNN Sample is missing. Please record some samples before starting play mode.")
@@ -52,24 +96,27 @@ class Application(DemoGUI, Pipeline):
         if self.is_recording:
             return
 
-        if len(self.pose_history) < 16:
-            logging.warnning("Video too short.")
+        # The inference thread appends to the history.
+        with self.history_lock:
+            if len(self.pose_history) < 16:
+                logging.warning("Video too short.")
+                self.reset_pipeline()
+                return
+
+            vid_res = {
+                "pose_frames": np.stack(self.pose_history),
+                "face_frames": np.stack(self.face_history),
+                "lh_frames": np.stack(self.lh_history),
+                "rh_frames": np.stack(self.rh_history),
+                "n_frames": len(self.pose_history)
+            }
             self.reset_pipeline()
-            return
-
-        vid_res = {
-            "pose_frames": np.stack(self.pose_history),
-            "face_frames": np.stack(self.face_history),
-            "lh_frames": np.stack(self.lh_history),
-            "rh_frames": np.stack(self.rh_history),
-            "n_frames": len(self.pose_history)
-        }
         feats = self.translator_manager.get_feats(vid_res)
-        self.reset_pipeline()
 
         # Play mode: run translator.
         if self.is_play_mode:
             res_txt = self.translator_manager.run_knn(feats)
+            self.mark_startup("first_prediction")
             self.console_box.delete('1.0', 'end')
             self.console_box.insert('end', f"Nearest class: {res_txt}\n")
 
@@ -78,12 +125,30 @@ class Application(DemoGUI, Pipeline):
             self.knn_records.append(feats)
             self.num_records_text.set(f"num records: {len(self.knn_records)}")
 
+    def continuous_btn_cb(self):
+        super().continuous_btn_cb()
+        self.reset_pipeline()
+
+    def process_frame(self, frame_rgb):
+        """Inference thread: holistic and drawing, in continuous mode also the translation of a detected sign."""
+        segment = self.update(frame_rgb)
+        if segment is None:
+            return None
+
+        feats = self.translator_manager.get_feats(segment)
+        res_txt = self.translator_manager.run_knn(feats)
+        self.mark_startup("first_prediction")
+        self.translation_queue.put(f"{res_txt} ({segment['n_frames']} frames)")
+
     def save_btn_cb(self):
         super().save_btn_cb()
 
         # Read texbox entry, use as folder name.
         gloss_name = self.name_box.get()
 
+        if not self.is_loaded:
+            logging.error("Models are still loading.")
+            return
         if (gloss_name == ""):
             logging.error("Empty gloss name.")
             return
@@ -100,30 +165,53 @@ class Application(DemoGUI, Pipeline):
         self.name_box.delete(0, 'end')
 
     def video_loop(self):
-
-        ret, frame = cap.read()
-        if not ret:
-            logging.error("Camera frame not available.")
+        """Main thread: show the latest processed frame with the stage counters."""
+        if self.capture_thread.failed or self.load_failed:
             self.close_all()
-        frame = utils.crop_utils.crop_square(frame)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        t1 = time.time()
-
-        self.update(frame_rgb)
 
-        t2 = time.time() - t1
-        cv2.putText(frame_rgb, "{:.0f} ms".format(t2 * 1000), (10, 50), cv2.FONT_HERSHEY_DUPLEX, 1, (203, 52, 247), 1)
-        self.show_frame(frame_rgb)
-
-        self.root.after(1, self.video_loop)
+        while not self.translation_queue.empty():
+            self.console_box.insert('end', self.translation_queue.get() + "\n")
+            self.console_box.see('end')
+
+        item = self.render_queue.get_nowait()
+        if item is not None:
+            frame_rgb = item["frame_rgb"]
+
+            # Capture to display, including the time waiting in queues.
+            self.render_counter.tick(time.perf_counter() - item["t_capture"])
+            capture, inference = self.capture_thread.counter, self.inference_thread.counter
+            stats = [
+                f"capture {capture.fps:.0f} fps",
+                f"inference {inference.fps:.0f} fps {inference.latency_ms:.0f} ms",
+                f"display {self.render_counter.fps:.0f} fps, latency {self.render_counter.latency_ms:.0f} ms",
+            ]
+            if not self.is_loaded:
+                stats.append("loading models...")
+            for i, text in enumerate(stats):
+                cv2.putText(frame_rgb, text, (10, 30 + 25 * i), cv2.FONT_HERSHEY_DUPLEX, 0.6, (203, 52, 247), 1)
+            self.show_frame(frame_rgb)
+            self.mark_startup("first_frame")
+
+        self.root.after(5, self.video_loop)
 
     def close_all(self):
+        self.capture_thread.stop()
+        self.inference_thread.stop()
+        self.capture_thread.join(timeout=1.)
+        self.inference_thread.join(timeout=1.)
 
         cap.release()
         cv2.destroyAllWindows()
+        logging.info("Startup times: " + ", ".join(f"{k} {v:.2f} s" for k, v in self.startup_times.items()))
         sys.exit()
 
 
 if __name__ == "__main__":
-    app = Application()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--eager',
+                        action='store_true',
+                        help="Load the models before showing the camera, instead of in a background thread.")
+    args = parser.parse_args()
+
+    app = Application(args.eager)
     app.root.mainloop()